@@ -11,25 +11,40 @@
 #   "pybase64",
 #   "python-dotenv",
 #   "httpx",
+#   "h2",
 #   "markdown",
 #   "duckdb",
+#   "pyarrow>=14",
 #   "beautifulsoup4",
+#   "lxml",
 #   "pillow",
 #   "faster-whisper",
 # ]
 # ///
 
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import PlainTextResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Body, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from application.tasksA import *
 from application.tasksB import *
+from application.cache import classification_cache, classifier_version, CLASSIFY_CACHE_ENABLED
+from application.router import route
+from application.dispatch import TASK_REGISTRY, dispatch, output_paths, shutdown_pools
+from application.jobs import JobQueue, QueueFull
+from application.transcribe import preload_models, shutdown_worker
+from application.prettier import preload_workers, shutdown_workers
 import requests
 from dotenv import load_dotenv
 import os
 import re
 import httpx
 import json
+import time
+import asyncio
+import mimetypes
+import stat
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
 
 app = FastAPI()
 
@@ -46,10 +61,19 @@ app = FastAPI()
 load_dotenv()
 
 @app.get("/ask")
-def ask(prompt: str):
-    result = get_completions(prompt)
+async def ask(prompt: str, nocache: bool = False):
+    result = await classify(prompt, use_cache=not nocache)
     return result
 
+@app.get("/cache/stats")
+async def cache_stats():
+    return classification_cache.info()
+
+@app.post("/cache/clear")
+async def cache_clear():
+    classification_cache.clear()
+    return {"message": "Classification cache cleared"}
+
 openai_api_chat  = "http://aiproxy.sanand.workers.dev/openai/v1/chat/completions" # for testing
 openai_api_key = os.getenv("AIPROXY_TOKEN")
 
@@ -77,7 +101,7 @@ function_definitions_llm = [
             "type": "object",
             "properties": {
                 "prettier_version": {"type": "string", "pattern": r"prettier@\d+\.\d+\.\d+"},
-                "filename": {"type": "string", "pattern": r".*/(.*\.md)"}
+                "filename": {"type": "string", "pattern": r".*/(.*\.md)", "description": "Markdown file to format, or a directory or glob pattern to format many files at once."}
             },
             "required": ["prettier_version", "filename"]
         }
@@ -153,6 +177,11 @@ function_definitions_llm = [
                     "type": "string",
                     "pattern": r".*/(.*\.json)",
                     "default": "/data/docs/index.json"
+                },
+                "incremental": {
+                    "type": "boolean",
+                    "default": True,
+                    "description": "Only re-read files changed since the last run. Set to false to rebuild from scratch."
                 }
             },
             "required": ["doc_dir_path", "output_file_path"]
@@ -160,19 +189,25 @@ function_definitions_llm = [
     },
     {
         "name": "A7",
-        "description": "Extract the sender's email address from a text file and save it to an output file.",
+        "description": "Extract the sender's email address from an email file, or from every email in a directory, and save it to an output file.",
         "parameters": {
             "type": "object",
             "properties": {
                 "filename": {
                     "type": "string",
-                    "pattern": r".*/(.*\.txt)",
-                    "default": "/data/email.txt"
+                    "pattern": r".*/(.*\.txt|[^./]+)",
+                    "default": "/data/email.txt",
+                    "description": "Email file to read, or a directory of email files to process in one batch."
                 },
                 "output_file": {
                     "type": "string",
                     "pattern": r".*/(.*\.txt)",
-                    "default": "/data/email-sender.txt"
+                    "default": "/data/email-sender.txt",
+                    "description": "File to write the sender to. In batch mode it gets one 'name<TAB>sender' line per email."
+                },
+                "pattern": {
+                    "type": "string",
+                    "description": "Glob pattern selecting files in batch mode, e.g. '*.eml'. Defaults to every file."
                 }
             },
             "required": ["filename", "output_file"]
@@ -180,19 +215,25 @@ function_definitions_llm = [
     },
     {
         "name": "A8",
-        "description": "Generate an image representation of credit card details from a text file.",
+        "description": "Extract the credit card number from an image, or from every image in a directory, and save it to a text file.",
         "parameters": {
             "type": "object",
             "properties": {
                 "filename": {
                     "type": "string",
                     "pattern": r".*/(.*\.txt)",
-                    "default": "/data/credit-card.txt"
+                    "default": "/data/credit-card.txt",
+                    "description": "Text file to write the card number to. In batch mode it gets one 'name<TAB>number' line per image."
                 },
                 "image_path": {
                     "type": "string",
-                    "pattern": r".*/(.*\.png)",
-                    "default": "/data/credit-card.png"
+                    "pattern": r".*/(.*\.(png|jpe?g|webp)|[^./]+)",
+                    "default": "/data/credit-card.png",
+                    "description": "Card image to read, or a directory of card images to process in one batch."
+                },
+                "pattern": {
+                    "type": "string",
+                    "description": "Glob pattern selecting images in batch mode. Defaults to '*.png'."
                 }
             },
             "required": ["filename", "image_path"]
@@ -272,6 +313,11 @@ function_definitions_llm = [
                     "type": "string",
                     "pattern": r".*/.*",
                     "description": "Path to save the downloaded content."
+                },
+                "reformat": {
+                    "type": "boolean",
+                    "description": "Pretty-print JSON, XML, CSV, HTML or YAML after downloading. Defaults to saving the bytes as received.",
+                    "default": False
                 }
             },
             "required": ["url", "save_path"]
@@ -335,8 +381,8 @@ function_definitions_llm = [
             "properties": {
                 "db_path": {
                     "type": "string",
-                    "pattern": r".*/(.*\.db)",
-                    "description": "Path to the SQLite database file."
+                    "pattern": r".*/(.*\.(db|sqlite|sqlite3|duckdb))",
+                    "description": "Path to the SQLite (.db, .sqlite) or DuckDB (.duckdb) database file."
                 },
                 "query": {
                     "type": "string",
@@ -344,8 +390,8 @@ function_definitions_llm = [
                 },
                 "output_filename": {
                     "type": "string",
-                    "pattern": r".*/(.*\.txt)",
-                    "description": "Path to the file where the query result will be saved."
+                    "pattern": r".*/(.*\.(txt|tsv|csv|jsonl|ndjson|parquet))",
+                    "description": "Path to the file where the query result will be saved. The format follows the extension: .csv, .jsonl/.ndjson (JSON Lines), .parquet, or tab-separated text for anything else."
                 }
             },
             "required": ["db_path", "query", "output_filename"]
@@ -382,6 +428,23 @@ function_definitions_llm = [
                     "type": "object",
                     "description": "Optional request headers (e.g., User-Agent).",
                     "nullable": True
+                },
+                "urls": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Crawl mode: list of page URLs to scrape concurrently. Output is JSON Lines, one record per page.",
+                    "nullable": True
+                },
+                "link_selector": {
+                    "type": "string",
+                    "description": "Crawl mode: CSS selector for links on the seed url whose pages should be scraped.",
+                    "nullable": True
+                },
+                "parser": {
+                    "type": "string",
+                    "enum": ["html.parser", "lxml"],
+                    "description": "HTML parser backend. 'lxml' is faster when installed.",
+                    "default": "html.parser"
                 }
             },
             "required": ["url", "output_filename", "extract_mode"]
@@ -395,11 +458,11 @@ function_definitions_llm = [
             "properties": {
                 "image_path": {
                     "type": "string",
-                    "description": "Path to the input image file."
+                    "description": "Path to the input image file, or a directory or glob pattern to process a batch of images."
                 },
                 "output_path": {
                     "type": "string",
-                    "description": "Path to save the processed image."
+                    "description": "Path to save the processed image, or the output directory in batch mode."
                 },
                 "resize": {
                     "type": "array",
@@ -420,6 +483,11 @@ function_definitions_llm = [
                     "minimum": 1,
                     "maximum": 100,
                     "description": "Quality factor (for JPEG format only). Defaults to 85."
+                },
+                "workers": {
+                    "type": "integer",
+                    "minimum": 1,
+                    "description": "Number of worker processes in batch mode. Defaults to the CPU count."
                 }
             },
             "required": ["image_path", "output_path"]
@@ -434,12 +502,12 @@ function_definitions_llm = [
                 "audio_path": {
                     "type": "string",
                     "pattern": r".*/(.*\.mp3)",
-                    "description": "Path to the MP3 file to be transcribed."
+                    "description": "Path to the MP3 file to be transcribed, or a directory or glob pattern to transcribe a batch of files."
                 },
                 "output_filename": {
                     "type": "string",
                     "pattern": r".*/(.*\.txt)",
-                    "description": "Path to the text file where the transcription will be saved."
+                    "description": "Path to the text file where the transcription will be saved, or the output directory in batch mode."
                 },
                 "model_size": {
                     "type": "string",
@@ -449,6 +517,25 @@ function_definitions_llm = [
                 "language": {
                     "type": "string",
                     "description": "Optional language code (e.g., 'en' for English). If not provided, auto-detection will be used."
+                },
+                "compute_type": {
+                    "type": "string",
+                    "enum": ["int8", "int8_float16", "int8_float32", "float32"],
+                    "description": "Model quantization. Defaults to 'int8', the fastest on CPU."
+                },
+                "cpu_threads": {
+                    "type": "integer",
+                    "minimum": 0,
+                    "description": "CPU threads used by the model. 0 uses the library default."
+                },
+                "beam_size": {
+                    "type": "integer",
+                    "minimum": 1,
+                    "description": "Beam size for decoding. Defaults to 5; 1 is greedy and fastest."
+                },
+                "vad_filter": {
+                    "type": "boolean",
+                    "description": "Skip silent parts of the audio using voice activity detection."
                 }
             },
             "required": ["audio_path", "output_filename"]
@@ -463,12 +550,12 @@ function_definitions_llm = [
                 "md_path": {
                     "type": "string",
                     "pattern": ".*/(.*\\.md)",
-                    "description": "Path to the Markdown file to be converted."
+                    "description": "Path to the Markdown file to be converted, or a docs directory to convert every .md file in it."
                 },
                 "output_path": {
                     "type": "string",
                     "pattern": ".*/.*",
-                    "description": "Path where the converted file will be saved."
+                    "description": "Path where the converted file will be saved, or the output directory when converting a docs directory."
                 },
                 "extensions": {
                     "type": "array",
@@ -476,6 +563,11 @@ function_definitions_llm = [
                         "type": "string"
                     },
                     "description": "Optional list of Markdown extensions to enable, such as 'extra', 'codehilite', or 'toc'."
+                },
+                "workers": {
+                    "type": "integer",
+                    "minimum": 1,
+                    "description": "Number of worker processes when converting a docs directory. Defaults to the CPU count."
                 }
             },
             "required": ["md_path", "output_path"]
@@ -483,101 +575,334 @@ function_definitions_llm = [
     }
 ]
 
-def get_completions(prompt: str):
-    with httpx.Client(timeout=20) as client:
-        response = client.post(
-            f"{openai_api_chat}",
-            headers=headers,
-            json=
-                {
-                    "model": "gpt-4o-mini",
-                    "messages": [
-                                    {"role": "system", "content": "You are a function classifier that extracts structured parameters from queries. The queries may be in any language. If in filepaths do not start with /data/, do not append /data/ at the beginning of filepaths by yourself. Send the exact path given only."},
-                                    {"role": "user", "content": prompt}
-                                ],
-                    "tools": [
-                                {
-                                    "type": "function",
-                                    "function": function
-                                } for function in function_definitions_llm
-                            ],
-                    "tool_choice": "auto"
-                },
+# Shared LLM client: one connection pool for the lifetime of the app
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") != "0"
+
+llm_client = None
+
+def http2_available():
+    """HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 without it."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def get_llm_client():
+    global llm_client
+    if llm_client is None or llm_client.is_closed:
+        llm_client = httpx.AsyncClient(
+            timeout=LLM_TIMEOUT,
+            http2=LLM_HTTP2 and http2_available(),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
         )
-    print(response.json()["choices"][0]["message"]["tool_calls"][0]["function"])
-    return response.json()["choices"][0]["message"]["tool_calls"][0]["function"]
+    return llm_client
+
+@app.on_event("startup")
+async def open_llm_client():
+    get_llm_client()
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    global llm_client
+    if llm_client is not None:
+        await llm_client.aclose()
+        llm_client = None
+
+@app.on_event("shutdown")
+async def close_task_pools():
+    shutdown_pools()
+
+@app.on_event("startup")
+async def preload_whisper_models():
+    preload_models()
+
+@app.on_event("shutdown")
+async def stop_whisper_worker():
+    shutdown_worker()
+
+@app.on_event("startup")
+async def start_prettier_workers():
+    preload_workers()
+
+@app.on_event("shutdown")
+async def stop_prettier_workers():
+    shutdown_workers()
+
+CLASSIFIER_MODEL = "gpt-4o-mini"
+CLASSIFIER_SYSTEM_PROMPT = "You are a function classifier that extracts structured parameters from queries. The queries may be in any language. If in filepaths do not start with /data/, do not append /data/ at the beginning of filepaths by yourself. Send the exact path given only."
+
+async def get_completions(prompt: str):
+    client = get_llm_client()
+    response = await client.post(
+        f"{openai_api_chat}",
+        headers=headers,
+        json=
+            {
+                "model": CLASSIFIER_MODEL,
+                "messages": [
+                                {"role": "system", "content": CLASSIFIER_SYSTEM_PROMPT},
+                                {"role": "user", "content": prompt}
+                            ],
+                "tools": [
+                            {
+                                "type": "function",
+                                "function": function
+                            } for function in function_definitions_llm
+                        ],
+                "tool_choice": "auto"
+            },
+    )
+    function_call = response.json()["choices"][0]["message"]["tool_calls"][0]["function"]
+    print(function_call)
+    return function_call
+
+
+task_functions = {name: func for name, (func, _) in TASK_REGISTRY.items()}
+classification_cache.version = classifier_version(CLASSIFIER_MODEL, CLASSIFIER_SYSTEM_PROMPT, function_definitions_llm)
+
+async def classify(prompt: str, use_cache: bool = True):
+    """Resolve a prompt to a tool call: local router first, then the cache, then the LLM."""
+    routed = route(prompt, function_definitions_llm, task_functions)
+    if routed is not None:
+        print(f"Routed locally: {routed}")
+        return routed
+    use_cache = use_cache and CLASSIFY_CACHE_ENABLED
+    if use_cache:
+        cached = classification_cache.get(prompt)
+        if cached is not None:
+            print(f"Classification cache hit: {cached}")
+            return cached
+    function_call = await get_completions(prompt)
+    if use_cache:
+        classification_cache.set(prompt, function_call)
+    return function_call
+
+
+async def execute_task(task: str, nocache: bool = False):
+    """Classify a task string and run the matching A*/B* function."""
+    print('Trying to execute task')
+    response = await classify(task, use_cache=not nocache)
+    print(response)
+    task_code = response['name']
+    arguments = response['arguments']
+
+    print('identifying task')
+    result = await dispatch(task_code, json.loads(arguments))
+    return {"message": f"{task_code} Task '{task}' executed successfully", "result": result}
+
+job_queue = JobQueue(execute_task)
+
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
 
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
 
 # Placeholder for task execution
 @app.post("/run")
-async def run_task(task: str):
+async def run_task(task: str, nocache: bool = False, async_: bool = Query(False, alias="async")):
+    if async_:
+        try:
+            job_id = job_queue.submit(task, {"nocache": nocache})
+        except QueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
     try:
-        print('Trying to execute task')
-        # Placeholder logic for executing tasks
-        # Replace with actual logic to parse task and execute steps
-        # Example: Execute task and return success or error based on result
-        # llm_response = function_calling(tast), function_name = A1
-        response = get_completions(task)
-        print(response)
-        task_code = response['name']
-        arguments = response['arguments']
-
-        print('identifying task')
-        if "A1"== task_code:
-            print('task a1 identified')
-            await A1(**json.loads(arguments))
-            print('task a1 done')
-        if "A2"== task_code:
-            await A2(**json.loads(arguments))
-        if "A3"== task_code:
-            A3(**json.loads(arguments))
-        if "A4"== task_code:
-            A4(**json.loads(arguments))
-        if "A5"== task_code:
-            A5(**json.loads(arguments))
-        if "A6"== task_code:
-            A6(**json.loads(arguments))
-        if "A7"== task_code:
-            A7(**json.loads(arguments))
-        if "A8"== task_code:
-            A8(**json.loads(arguments))
-        if "A9"== task_code:
-            await A9(**json.loads(arguments))
-        if "A10"== task_code:
-            A10(**json.loads(arguments))
-
-
-        if "B1"== task_code:
-            B1(**json.loads(arguments))
-        if "B3" == task_code:
-            B3(**json.loads(arguments))
-        if "B4" == task_code:
-            B4(**json.loads(arguments))
-        if "B5" == task_code:
-            B5(**json.loads(arguments))
-        if "B6" == task_code:
-            B6(**json.loads(arguments))
-        if "B7" == task_code:
-            B7(**json.loads(arguments))
-        if "B8" == task_code:
-            B8(**json.loads(arguments))
-        if "B9" == task_code:
-            B9(**json.loads(arguments))
-        return {"message": f"{task_code} Task '{task}' executed successfully"}
+        return await execute_task(task, nocache)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-# Placeholder for file reading
-@app.get("/read", response_class=PlainTextResponse)
-async def read_file(path: str = Query(..., description="File path to read")):
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+@app.post("/run/batch")
+async def run_batch(tasks: list[str] = Body(..., embed=True), nocache: bool = False,
+                    concurrency: int = Query(BATCH_CONCURRENCY, ge=1)):
+    """Classify all tasks concurrently, then execute them in parallel.
+
+    Tasks writing the same output path run in submission order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def classify_one(task):
+        async with semaphore:
+            return await classify(task, use_cache=not nocache)
+
+    calls = await asyncio.gather(*(classify_one(task) for task in tasks), return_exceptions=True)
+
+    # Each task waits for the previous task that writes any of the same paths
+    previous_writer, waits_for = {}, []
+    for i, call in enumerate(calls):
+        paths = set()
+        if not isinstance(call, BaseException):
+            try:
+                paths = output_paths(call["name"], json.loads(call["arguments"]))
+            except (ValueError, TypeError):
+                pass
+        waits_for.append({previous_writer[p] for p in paths if p in previous_writer})
+        for p in paths:
+            previous_writer[p] = i
+    finished = [asyncio.Event() for _ in tasks]
+
+    async def run_one(i, task, call):
+        entry = {"index": i, "task": task}
+        try:
+            if isinstance(call, BaseException):
+                raise call
+            entry["name"] = call["name"]
+            for j in waits_for[i]:
+                await finished[j].wait()
+            async with semaphore:
+                started = time.time()
+                entry["result"] = await dispatch(call["name"], json.loads(call["arguments"]))
+                entry["seconds"] = time.time() - started
+            entry["status"] = "succeeded"
+        except Exception as e:
+            entry["status"] = "failed"
+            entry["error"] = str(getattr(e, "detail", None) or e)
+        finally:
+            finished[i].set()
+        return entry
+
+    return await asyncio.gather(*(run_one(i, task, call) for i, (task, call) in enumerate(zip(tasks, calls))))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+READ_CHUNK_SIZE = int(os.getenv("READ_CHUNK_SIZE", str(64 * 1024)))
+READ_GZIP_MIN_SIZE = 1024
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+def guess_media_type(path):
+    media_type, _ = mimetypes.guess_type(path)
+    if media_type is None:
+        # Unknown extension: treat as text unless the first block has NUL bytes
+        with open(path, "rb") as f:
+            media_type = "application/octet-stream" if b"\0" in f.read(8192) else "text/plain"
+    if media_type.startswith("text/") or media_type in ("application/json", "application/xml", "application/javascript"):
+        return f"{media_type}; charset=utf-8", True
+    return media_type, False
+
+def parse_range(header, size):
+    """Single `bytes=start-end` range -> (start, end) inclusive, or None if unsatisfiable."""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start == "":
+        length = int(end)
+        if length == 0:
+            return None
+        start, end = max(size - length, 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+def iter_file(path, start, end, compress=False):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+@app.get("/read")
+async def read_file(request: Request, path: str = Query(..., description="File path to read"),
+                    compress: bool = Query(True, description="Gzip text responses when the client accepts it")):
     try:
-        with open(path, "r") as file:
-            return file.read()
+        st = os.stat(path)
+        if stat.S_ISDIR(st.st_mode):
+            raise HTTPException(status_code=400, detail=f"Path is a directory: {path}")
+        media_type, is_text = guess_media_type(path)
+    except HTTPException:
+        raise
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    size = st.st_size
+    identity_etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+    last_modified = formatdate(st.st_mtime, usegmt=True)
+
+    # Only a single bytes range is supported; other Range headers are ignored and a 200 is sent
+    range_header = request.headers.get("range")
+    range_match = RANGE_RE.match(range_header.strip()) if range_header else None
+    if_range = request.headers.get("if-range")
+    use_range = (range_match is not None and range_match.groups() != ("", "")
+                 and (if_range is None or if_range in (identity_etag, last_modified)))
+
+    gzip_ok = "gzip" in request.headers.get("accept-encoding", "").lower()
+    gzip_eligible = compress and is_text and size >= READ_GZIP_MIN_SIZE
+    use_gzip = gzip_eligible and gzip_ok and not use_range
+    # The gzip variant has different bytes, so it gets its own strong ETag
+    etag = f'{identity_etag[:-1]}-gz"' if use_gzip else identity_etag
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",
+    }
+    if gzip_eligible:
+        headers["Vary"] = "Accept-Encoding"
+    if not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    if use_range:
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                                headers={"Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(iter_file(path, start, end), status_code=206, media_type=media_type, headers=headers)
+
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(iter_file(path, 0, size - 1, compress=True), media_type=media_type, headers=headers)
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(iter_file(path, 0, size - 1), media_type=media_type, headers=headers)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
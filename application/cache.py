@@ -0,0 +1,156 @@
+# Classification cache: normalized prompt -> {name, arguments} tool call
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from dotenv import load_dotenv
+load_dotenv()
+
+CLASSIFY_CACHE_ENABLED = os.getenv("CLASSIFY_CACHE", "1") != "0"
+CLASSIFY_CACHE_PATH = os.getenv("CLASSIFY_CACHE_PATH", os.path.expanduser("~/.cache/tdsp1/classify.sqlite"))
+CLASSIFY_CACHE_MEMORY_SIZE = int(os.getenv("CLASSIFY_CACHE_MEMORY_SIZE", "1024"))
+CLASSIFY_CACHE_DISK_SIZE = int(os.getenv("CLASSIFY_CACHE_DISK_SIZE", "100000"))
+CLASSIFY_CACHE_TTL = float(os.getenv("CLASSIFY_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace and unicode forms. Case is kept since file paths are case-sensitive."""
+    prompt = unicodedata.normalize("NFC", prompt)
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def classifier_version(*parts):
+    """Fingerprint of everything that shapes a tool call (model, system prompt, tool schemas)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class ClassificationCache:
+    """Two-tier cache: an in-process LRU in front of a SQLite table that survives restarts."""
+
+    def __init__(self, path=CLASSIFY_CACHE_PATH, memory_size=CLASSIFY_CACHE_MEMORY_SIZE,
+                 disk_size=CLASSIFY_CACHE_DISK_SIZE, ttl=CLASSIFY_CACHE_TTL):
+        self.path = path
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.ttl = ttl
+        # Part of every key, so entries classified against older schemas are never replayed
+        self.version = ""
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self.conn = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS classifications ("
+                "key TEXT PRIMARY KEY, prompt TEXT, function_call TEXT, created REAL, accessed REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS classifications_accessed ON classifications(accessed)")
+            self.conn.commit()
+
+    def key(self, prompt):
+        return hashlib.sha256(f"{self.version}\0{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created):
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def get(self, prompt):
+        key = self.key(prompt)
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                created, function_call = entry
+                if not self._expired(created):
+                    self.memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return dict(function_call)
+                del self.memory[key]
+                self.stats["evictions"] += 1
+
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT function_call, created FROM classifications WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    function_call, created = json.loads(row[0]), row[1]
+                    if not self._expired(created):
+                        self.conn.execute("UPDATE classifications SET accessed = ? WHERE key = ?", (time.time(), key))
+                        self.conn.commit()
+                        self._remember(key, created, function_call)
+                        self.stats["disk_hits"] += 1
+                        return dict(function_call)
+                    self.conn.execute("DELETE FROM classifications WHERE key = ?", (key,))
+                    self.conn.commit()
+                    self.stats["evictions"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, prompt, function_call):
+        key = self.key(prompt)
+        function_call = {"name": function_call["name"], "arguments": function_call["arguments"]}
+        now = time.time()
+        with self.lock:
+            self._remember(key, now, function_call)
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO classifications VALUES (?, ?, ?, ?, ?)",
+                    (key, normalize_prompt(prompt), json.dumps(function_call), now, now),
+                )
+                self._evict_disk()
+                self.conn.commit()
+
+    def _remember(self, key, created, function_call):
+        self.memory[key] = (created, function_call)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _evict_disk(self):
+        if self.ttl > 0:
+            deleted = self.conn.execute(
+                "DELETE FROM classifications WHERE created < ?", (time.time() - self.ttl,)
+            ).rowcount
+            self.stats["evictions"] += max(deleted, 0)
+        count = self.conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+        if count > self.disk_size:
+            deleted = self.conn.execute(
+                "DELETE FROM classifications WHERE key IN "
+                "(SELECT key FROM classifications ORDER BY accessed LIMIT ?)",
+                (count - self.disk_size,),
+            ).rowcount
+            self.stats["evictions"] += max(deleted, 0)
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM classifications")
+                self.conn.commit()
+
+    def info(self):
+        with self.lock:
+            disk_entries = 0
+            if self.conn is not None:
+                disk_entries = self.conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+            lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            return {
+                **self.stats,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "disk_entries": disk_entries,
+                "enabled": CLASSIFY_CACHE_ENABLED,
+                "version": self.version,
+            }
+
+
+classification_cache = ClassificationCache()
@@ -0,0 +1,111 @@
+# Task registry and dispatcher: run A*/B* tasks off the event loop thread
+import os
+import asyncio
+import multiprocessing
+import inspect
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from fastapi import HTTPException
+from dotenv import load_dotenv
+from .tasksA import A1, A2, A3, A4, A5, A6, A7, A8, A9, A10
+from .tasksB import B1, B3, B4, B5, B6, B7, B8, B9
+load_dotenv()
+
+TASK_THREAD_WORKERS = int(os.getenv("TASK_THREAD_WORKERS", "16"))
+TASK_PROCESS_WORKERS = int(os.getenv("TASK_PROCESS_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+# Execution classes
+INLINE = "inline"    # cheap checks, run directly on the event loop
+THREAD = "thread"    # IO-bound: subprocesses, network, file reads/writes
+PROCESS = "process"  # CPU-bound: image work, transcription, similarity
+
+TASK_REGISTRY = {
+    "A1": (A1, THREAD),
+    "A2": (A2, THREAD),
+    "A3": (A3, THREAD),
+    "A4": (A4, THREAD),
+    "A5": (A5, THREAD),
+    "A6": (A6, THREAD),
+    "A7": (A7, THREAD),
+    "A8": (A8, THREAD),
+    "A9": (A9, PROCESS),
+    "A10": (A10, THREAD),
+    "B1": (B1, INLINE),
+    "B3": (B3, THREAD),
+    "B4": (B4, THREAD),
+    "B5": (B5, THREAD),
+    "B6": (B6, THREAD),
+    "B7": (B7, PROCESS),
+    "B8": (B8, THREAD),  # Waits on the dedicated whisper worker process
+    "B9": (B9, THREAD),
+}
+
+# Arguments naming the file or directory a task writes to. A2 and A8 write back to `filename`.
+OUTPUT_ARGUMENTS = ("targetfile", "output_file", "output_file_path", "output_filename", "output_path", "save_path", "repo_path")
+IN_PLACE_TASKS = ("A2", "A8")
+
+thread_pool = None
+process_pool = None
+
+
+def get_thread_pool():
+    global thread_pool
+    if thread_pool is None:
+        thread_pool = ThreadPoolExecutor(max_workers=TASK_THREAD_WORKERS, thread_name_prefix="task")
+    return thread_pool
+
+
+def get_process_pool():
+    global process_pool
+    if process_pool is None:
+        # The server is multi-threaded by now, and forking a threaded process can deadlock the child
+        process_pool = ProcessPoolExecutor(max_workers=TASK_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return process_pool
+
+
+def shutdown_pools():
+    global thread_pool, process_pool
+    if thread_pool is not None:
+        thread_pool.shutdown(wait=False, cancel_futures=True)
+        thread_pool = None
+    if process_pool is not None:
+        process_pool.shutdown(wait=False, cancel_futures=True)
+        process_pool = None
+
+
+def output_paths(task_code, arguments):
+    """Absolute paths a task will write, used to keep writers of the same file in order."""
+    names = OUTPUT_ARGUMENTS + (("filename",) if task_code in IN_PLACE_TASKS else ())
+    func = TASK_REGISTRY.get(task_code, (None, None))[0]
+    defaults = {}
+    if func is not None:
+        defaults = {k: v.default for k, v in inspect.signature(func).parameters.items()
+                    if v.default is not inspect.Parameter.empty}
+    paths = set()
+    for name in names:
+        value = arguments.get(name, defaults.get(name))
+        if isinstance(value, str) and value:
+            paths.add(os.path.abspath(value))
+    return paths
+
+
+def call_task(func, arguments):
+    """Run a task to completion in a worker. Some tasks are `async def` but block internally."""
+    try:
+        if inspect.iscoroutinefunction(func):
+            return asyncio.run(func(**arguments))
+        return func(**arguments)
+    except HTTPException as e:
+        # Positional args so the exception survives pickling back from a worker process
+        raise HTTPException(e.status_code, e.detail)
+
+
+async def dispatch(task_code, arguments):
+    """Look up a task by name and run it on the executor matching its execution class."""
+    if task_code not in TASK_REGISTRY:
+        raise HTTPException(status_code=400, detail=f"Unknown task: {task_code}")
+    func, execution = TASK_REGISTRY[task_code]
+    if execution == INLINE:
+        return call_task(func, arguments)
+    pool = get_process_pool() if execution == PROCESS else get_thread_pool()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, call_task, func, arguments)
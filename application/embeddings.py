@@ -0,0 +1,262 @@
+# Embeddings for A9: pluggable backends, deduplication and a memory-mapped disk cache
+import os
+import re
+import json
+import zlib
+import fcntl
+import sqlite3
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+import requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from dotenv import load_dotenv
+load_dotenv()
+
+AIPROXY_TOKEN = os.getenv('AIPROXY_TOKEN')
+EMBEDDINGS_URL = "http://aiproxy.sanand.workers.dev/openai/v1/embeddings"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# Per-request limits: the API caps inputs per request and total tokens (~4 chars per token)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "512"))
+EMBEDDING_BATCH_CHARS = int(os.getenv("EMBEDDING_BATCH_CHARS", str(600_000)))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+# remote | hashing | sentence-transformers
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "remote")
+EMBEDDING_HASH_DIM = int(os.getenv("EMBEDDING_HASH_DIM", "1024"))
+EMBEDDING_LOCAL_MODEL = os.getenv("EMBEDDING_LOCAL_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.expanduser("~/.cache/tdsp1/embeddings"))
+
+session = requests.Session()
+
+
+class EmbeddingCache:
+    """
+    Vectors keyed by (model, sha256(text)).
+
+    Rows live in one append-only float32 file per model that is read through np.memmap;
+    a SQLite table maps each text hash to its row.
+    """
+
+    def __init__(self, model, directory=EMBEDDING_CACHE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r"[^\w.-]", "_", model)
+        self.vectors_path = os.path.join(directory, f"{name}.f32")
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, f"{name}.sqlite"), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS rows (hash TEXT PRIMARY KEY, row INTEGER)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+        self.dim = None
+        self._load_dim()
+
+    def _load_dim(self):
+        if self.dim is None:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+            self.dim = int(row[0]) if row else None
+        return self.dim
+
+    def _rows(self):
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (4 * self.dim)
+
+    def lookup(self, hashes):
+        """hash -> row for the hashes already cached."""
+        found = {}
+        with self.lock:
+            for i in range(0, len(hashes), 900):
+                batch = hashes[i:i + 900]
+                query = f"SELECT hash, row FROM rows WHERE hash IN ({','.join('?' * len(batch))})"
+                found.update(self.conn.execute(query, batch).fetchall())
+        return found
+
+    def vectors(self, rows):
+        with self.lock:
+            self._load_dim()
+            count = self._rows()
+        if not rows:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+        return np.asarray(matrix[np.asarray(rows)])
+
+    def add(self, hashes, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        # A9 runs in worker processes, so appends are serialized with a file lock too
+        with self.lock, open(self.vectors_path, "ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if self._load_dim() is None:
+                    self.dim = vectors.shape[1]
+                    self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+                start = f.seek(0, os.SEEK_END) // (4 * self.dim)
+                f.write(vectors.tobytes())
+                f.flush()
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO rows VALUES (?, ?)",
+                    [(h, start + i) for i, h in enumerate(hashes)],
+                )
+                self.conn.commit()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+caches = {}
+
+
+def get_cache(model=EMBEDDING_MODEL):
+    if model not in caches:
+        caches[model] = EmbeddingCache(model)
+    return caches[model]
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_texts(texts, max_items=EMBEDDING_BATCH_SIZE, max_chars=EMBEDDING_BATCH_CHARS):
+    """Split texts into request-sized chunks bounded by item count and total characters."""
+    chunk, size = [], 0
+    for text in texts:
+        if chunk and (len(chunk) >= max_items or size + len(text) > max_chars):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(text)
+        size += len(text)
+    if chunk:
+        yield chunk
+
+
+def request_embeddings(texts, model=EMBEDDING_MODEL):
+    """Fetch embeddings for one chunk of texts in a single request."""
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {AIPROXY_TOKEN}"
+    }
+    data = {
+        "model": model,
+        "input": texts
+    }
+    response = session.post(EMBEDDINGS_URL, headers=headers, data=json.dumps(data))
+    if response.status_code >= 400:
+        raise HTTPException(status_code=response.status_code, detail=f"Embeddings API request failed with status {response.status_code}: {response.text}")
+    items = sorted(response.json()["data"], key=lambda item: item["index"])
+    return np.array([item["embedding"] for item in items], dtype=np.float32)
+
+
+class EmbeddingBackend(ABC):
+    """Turns a list of texts into a float32 matrix, one row per text."""
+    name = None
+    cacheable = True  # Worth storing in the on-disk cache
+
+    @abstractmethod
+    def embed(self, texts):
+        ...
+
+
+class RemoteEmbeddingBackend(EmbeddingBackend):
+    """OpenAI embeddings through the AI proxy, in size-bounded chunks sent concurrently."""
+
+    def __init__(self, model=EMBEDDING_MODEL, concurrency=EMBEDDING_CONCURRENCY):
+        self.name = model
+        self.concurrency = concurrency
+
+    def embed(self, texts):
+        chunks = list(chunk_texts(texts))
+        print(f'Embedding {len(texts)} new text(s) in {len(chunks)} request(s)')
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(chunks)))) as pool:
+            results = list(pool.map(lambda chunk: request_embeddings(chunk, self.name), chunks))
+        return np.concatenate(results)
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Local CPU vectors from hashed word and character n-grams with sublinear term frequency.
+    No model to load and no network, so it is too cheap to be worth caching.
+    """
+    cacheable = False
+
+    def __init__(self, dim=EMBEDDING_HASH_DIM, ngram_range=(3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        text = text.lower()
+        features = re.findall(r"\w+", text)
+        padded = f" {text} "
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                # Signed hashing keeps collisions from only ever adding up
+                index, sign = h % self.dim, 1.0 if h & 0x80000000 else -1.0
+                counts[index] = counts.get(index, 0.0) + sign
+            if counts:
+                indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+                values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+                matrix[row, indices] = np.sign(values) * (1 + np.log(np.abs(values) + (values == 0)))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """A small local model, loaded once and kept warm for the life of the process."""
+
+    def __init__(self, model=EMBEDDING_LOCAL_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.name = f"local-{model}"
+        self.model = SentenceTransformer(model, device="cpu")
+
+    def embed(self, texts):
+        return self.model.encode(texts, batch_size=64, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32)
+
+
+BACKENDS = {
+    "remote": RemoteEmbeddingBackend,
+    "hashing": HashingEmbeddingBackend,
+    "sentence-transformers": SentenceTransformerBackend,
+}
+backends = {}
+
+
+def get_backend(name=EMBEDDING_BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {name!r}; choose from {', '.join(BACKENDS)}")
+    if name not in backends:
+        backends[name] = BACKENDS[name]()
+    return backends[name]
+
+
+def get_embeddings(texts, backend=None, use_cache=True):
+    """Embeddings for texts, in order. Duplicates are embedded once and cached vectors are never recomputed."""
+    backend = backend if isinstance(backend, EmbeddingBackend) else get_backend(backend or EMBEDDING_BACKEND)
+    unique = list(dict.fromkeys(texts))
+    hashes = [text_hash(text) for text in unique]
+    hash_of = dict(zip(unique, hashes))
+    cache = get_cache(backend.name) if use_cache and backend.cacheable else None
+    cached = cache.lookup(hashes) if cache is not None else {}
+
+    missing = [(text, h) for text, h in zip(unique, hashes) if h not in cached]
+    fetched = {}
+    if missing:
+        vectors = backend.embed([text for text, _ in missing])
+        missing_hashes = [h for _, h in missing]
+        fetched = dict(zip(missing_hashes, vectors))
+        if cache is not None:
+            cache.add(missing_hashes, vectors)
+
+    cached_hashes = [h for h in hashes if h in cached]
+    by_hash = dict(fetched)
+    if cached_hashes:
+        by_hash.update(zip(cached_hashes, cache.vectors([cached[h] for h in cached_hashes])))
+    return np.stack([by_hash[hash_of[text]] for text in texts]) if texts else np.zeros((0, 0), dtype=np.float32)
@@ -0,0 +1,137 @@
+# External merge sort for JSON arrays larger than memory (A4 streaming mode)
+import os
+import json
+import heapq
+import tempfile
+
+READ_SIZE = 1024 * 1024
+MAX_MERGE_FANIN = 128
+
+
+def iter_json_array(f, read_size=READ_SIZE):
+    """Yield the items of a top-level JSON array from a text file without loading it whole."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(read_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    fill()
+    skip_whitespace()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    first = True
+    while True:
+        skip_whitespace()
+        if pos >= len(buf):
+            raise ValueError("Unterminated JSON array")
+        if buf[pos] == "]":
+            return
+        if not first:
+            if buf[pos] != ",":
+                raise ValueError(f"Expected ',' in JSON array, found {buf[pos]!r}")
+            pos += 1
+            skip_whitespace()
+        first = False
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                # A value touching the end of the buffer (e.g. a number) may continue in the next read
+                if end < len(buf) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+        pos = end
+        yield item
+
+
+def _spill(records, key, directory):
+    records.sort(key=key)
+    fd, path = tempfile.mkstemp(suffix=".jsonl", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(",", ":")))
+            f.write("\n")
+    return path
+
+
+def _read_run(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _merge(paths, key):
+    files = [_read_run(path) for path in paths]
+    return heapq.merge(*files, key=key)
+
+
+def external_sort_json(filename, targetfile, key, run_size=100_000, tmp_dir=None):
+    """
+    Sort a JSON array file by `key` with bounded memory.
+
+    Items are parsed incrementally, sorted in runs of `run_size`, spilled to temp files and
+    k-way merged into a compact JSON array. The sort is stable, like sorted().
+    """
+    runs = []
+    tmp_dir = tmp_dir or os.path.dirname(os.path.abspath(targetfile))
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            records = []
+            for record in iter_json_array(f):
+                records.append(record)
+                if len(records) >= run_size:
+                    runs.append(_spill(records, key, tmp_dir))
+                    records = []
+            if records or not runs:
+                runs.append(_spill(records, key, tmp_dir))
+
+        # Keep the number of open files bounded with intermediate merge passes.
+        # Adjacent runs are merged together so the overall sort stays stable.
+        while len(runs) > MAX_MERGE_FANIN:
+            merged_runs = []
+            for i in range(0, len(runs), MAX_MERGE_FANIN):
+                group = runs[i:i + MAX_MERGE_FANIN]
+                merged = _spill([], key, tmp_dir)
+                with open(merged, "w", encoding="utf-8") as out:
+                    for record in _merge(group, key):
+                        out.write(json.dumps(record, separators=(",", ":")))
+                        out.write("\n")
+                for path in group:
+                    os.remove(path)
+                merged_runs.append(merged)
+            runs = merged_runs
+
+        count = 0
+        tmp_target = f"{targetfile}.tmp"
+        with open(tmp_target, "w", encoding="utf-8") as out:
+            out.write("[")
+            for record in _merge(runs, key):
+                if count:
+                    out.write(",")
+                out.write(json.dumps(record, separators=(",", ":")))
+                count += 1
+            out.write("]")
+        os.replace(tmp_target, targetfile)
+        return count
+    finally:
+        for path in runs:
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,165 @@
+# Asynchronous job queue for /run?async=1, persisted to SQLite
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+from dotenv import load_dotenv
+load_dotenv()
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.expanduser("~/.cache/tdsp1/jobs.sqlite"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+# Finished jobs are kept this long, and at most JOB_MAX_ROWS of them
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOB_MAX_ROWS = int(os.getenv("JOB_MAX_ROWS", "10000"))
+PRUNE_EVERY = 100
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+INTERRUPTED = "interrupted"
+FINISHED = (SUCCEEDED, FAILED, INTERRUPTED)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobStore:
+    """Job records in a local SQLite file so queued work survives a restart."""
+
+    def __init__(self, path=JOBS_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, task TEXT, options TEXT, status TEXT, "
+            "created REAL, started REAL, finished REAL, result TEXT, error TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs(finished)")
+        self.conn.commit()
+        self.created = 0
+
+    def create(self, task, options):
+        job_id = uuid.uuid4().hex
+        self.conn.execute(
+            "INSERT INTO jobs (id, task, options, status, created) VALUES (?, ?, ?, ?, ?)",
+            (job_id, task, json.dumps(options), QUEUED, time.time()),
+        )
+        self.conn.commit()
+        self.created += 1
+        if self.created % PRUNE_EVERY == 0:
+            self.prune()
+        return job_id
+
+    def update(self, job_id, **fields):
+        columns = ", ".join(f"{k} = ?" for k in fields)
+        self.conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+        self.conn.commit()
+
+    def get(self, job_id):
+        row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["options"] = json.loads(job["options"] or "{}")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["queue_seconds"] = (job["started"] or time.time()) - job["created"] if job["created"] else None
+        job["run_seconds"] = (job["finished"] or time.time()) - job["started"] if job["started"] else None
+        return job
+
+    def pending(self):
+        """Jobs that were queued but never started, oldest first."""
+        rows = self.conn.execute(
+            "SELECT id, task, options FROM jobs WHERE status = ? ORDER BY created", (QUEUED,)
+        ).fetchall()
+        return [(row["id"], row["task"], json.loads(row["options"] or "{}")) for row in rows]
+
+    def interrupt_running(self):
+        """
+        Mark jobs that were mid-run when the server stopped as interrupted. They are not re-run:
+        tasks like B4 (push) or A1 (datagen) are not safe to repeat after a partial run.
+        """
+        count = self.conn.execute(
+            "UPDATE jobs SET status = ?, finished = ?, error = ? WHERE status = ?",
+            (INTERRUPTED, time.time(), "Interrupted by a server restart", RUNNING),
+        ).rowcount
+        self.conn.commit()
+        return count
+
+    def prune(self, retention=JOB_RETENTION_SECONDS, max_rows=JOB_MAX_ROWS):
+        """Drop finished jobs older than the retention period, then the oldest beyond max_rows."""
+        marks = ",".join("?" * len(FINISHED))
+        self.conn.execute(f"DELETE FROM jobs WHERE status IN ({marks}) AND finished < ?",
+                          (*FINISHED, time.time() - retention))
+        self.conn.execute(
+            f"DELETE FROM jobs WHERE status IN ({marks}) AND id NOT IN "
+            f"(SELECT id FROM jobs WHERE status IN ({marks}) ORDER BY finished DESC LIMIT ?)",
+            (*FINISHED, *FINISHED, max_rows),
+        )
+        self.conn.commit()
+
+
+class JobQueue:
+    """Bounded in-process queue drained by a fixed number of asyncio workers."""
+
+    def __init__(self, runner, store=None, workers=JOB_WORKERS, maxsize=JOB_QUEUE_SIZE):
+        self.runner = runner
+        self.store = store
+        self.workers = workers
+        self.maxsize = maxsize
+        self.queue = None
+        self.tasks = []
+
+    async def start(self):
+        if self.store is None:
+            self.store = JobStore()
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        interrupted = self.store.interrupt_running()
+        if interrupted:
+            print(f"Marked {interrupted} job(s) interrupted by the previous shutdown")
+        self.store.prune()
+        recovered = self.store.pending()
+        if recovered:
+            print(f"Re-queueing {len(recovered)} job(s) from a previous run")
+            self.tasks.append(asyncio.create_task(self._requeue(recovered)))
+
+    async def _requeue(self, jobs):
+        for job_id, task, options in jobs:
+            await self.queue.put((job_id, task, options))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def submit(self, task, options=None):
+        if self.queue is None:
+            raise RuntimeError("Job queue is not running")
+        if self.queue.full():
+            raise QueueFull(f"Job queue is full ({self.maxsize} jobs waiting)")
+        options = options or {}
+        job_id = self.store.create(task, options)
+        self.queue.put_nowait((job_id, task, options))
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id, task, options = await self.queue.get()
+            self.store.update(job_id, status=RUNNING, started=time.time())
+            try:
+                result = await self.runner(task, **options)
+                self.store.update(job_id, status=SUCCEEDED, finished=time.time(),
+                                  result=json.dumps(result, default=str))
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                self.store.update(job_id, status=FAILED, finished=time.time(), error=str(detail))
+            finally:
+                self.queue.task_done()
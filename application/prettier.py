@@ -0,0 +1,155 @@
+# Persistent Prettier workers for A2: one resident Node process per Prettier version
+import os
+import re
+import json
+import shutil
+import select
+import tempfile
+import threading
+import subprocess
+from dotenv import load_dotenv
+load_dotenv()
+
+PRETTIER_CACHE_DIR = os.getenv("PRETTIER_CACHE_DIR", os.path.expanduser("~/.cache/tdsp1/prettier"))
+PRETTIER_TIMEOUT = float(os.getenv("PRETTIER_TIMEOUT", "60"))
+# Comma-separated versions installed and started with the app, e.g. "prettier@3.4.2"
+PRETTIER_PRELOAD = [spec.strip() for spec in os.getenv("PRETTIER_PRELOAD", "").split(",") if spec.strip()]
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prettier_worker.js")
+
+install_lock = threading.Lock()
+
+
+def install_prettier(spec):
+    """Install a version like prettier@3.4.2 once into the cache dir and return its package path."""
+    name = re.sub(r"[^\w.@-]", "_", spec)
+    prefix = os.path.join(PRETTIER_CACHE_DIR, name)
+    package = os.path.join(prefix, "node_modules", "prettier")
+    with install_lock:
+        if os.path.exists(os.path.join(package, "package.json")):
+            return package
+        os.makedirs(PRETTIER_CACHE_DIR, exist_ok=True)
+        # Install into a staging dir and rename, so a half-finished install is never used
+        staging = tempfile.mkdtemp(prefix=f".{name}-", dir=PRETTIER_CACHE_DIR)
+        try:
+            print(f'installing {spec} into {prefix}')
+            subprocess.run(
+                ["npm", "install", "--prefix", staging, "--no-save", "--no-audit", "--no-fund", "--prefer-offline", spec],
+                check=True, stdout=subprocess.DEVNULL,
+            )
+            shutil.rmtree(prefix, ignore_errors=True)
+            os.rename(staging, prefix)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    return package
+
+
+class PrettierWorker:
+    """A resident `node prettier_worker.js` process for one Prettier version. Requests are serialized."""
+
+    def __init__(self, spec, timeout=PRETTIER_TIMEOUT):
+        self.spec = spec
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.proc = None
+        self.next_id = 0
+
+    def _start(self):
+        package = install_prettier(self.spec)
+        self.proc = subprocess.Popen(
+            ["node", WORKER_SCRIPT, package],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding="utf-8",
+        )
+        if "ready" not in self._read():
+            raise RuntimeError(f"Prettier worker for {self.spec} did not start")
+        print(f'prettier worker for {self.spec} started (pid {self.proc.pid})')
+
+    def _stop(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=5)
+        except Exception:
+            self.proc.kill()
+        self.proc = None
+
+    def _read(self):
+        ready, _, _ = select.select([self.proc.stdout], [], [], self.timeout)
+        if not ready:
+            raise TimeoutError(f"Prettier worker did not answer within {self.timeout}s")
+        line = self.proc.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Prettier worker exited with code {self.proc.poll()}")
+        return json.loads(line)
+
+    def _request(self, files):
+        self.next_id += 1
+        self.proc.stdin.write(json.dumps({"id": self.next_id, "files": list(files)}) + "\n")
+        self.proc.stdin.flush()
+        reply = self._read()
+        if reply.get("id") != self.next_id:
+            raise RuntimeError(reply.get("error") or "Prettier worker answered out of order")
+        return reply["results"]
+
+    def format_files(self, files):
+        """Format files in place. Returns one {"file", "changed"} or {"file", "error"} dict per file."""
+        with self.lock:
+            for attempt in range(2):
+                restarted = self.proc is None or self.proc.poll() is not None
+                try:
+                    if restarted:
+                        self._start()
+                    return self._request(files)
+                except Exception:
+                    # The worker's state is unknown now; a long-lived one that failed gets one restart
+                    self._stop()
+                    if restarted or attempt:
+                        raise
+
+    def close(self):
+        with self.lock:
+            self._stop()
+
+
+workers = {}
+workers_lock = threading.Lock()
+
+
+def get_worker(spec):
+    with workers_lock:
+        if spec not in workers:
+            workers[spec] = PrettierWorker(spec)
+        return workers[spec]
+
+
+def format_files(files, spec):
+    """Format files with the resident worker for `spec`, falling back to a single npx call."""
+    if not files:
+        return {"files": 0, "changed": 0, "errors": {}}
+    try:
+        results = get_worker(spec).format_files(files)
+    except Exception as e:
+        print(f"Prettier worker unavailable, using npx: {e}")
+        subprocess.run(["npx", "--yes", spec, "--write", *files], check=True)
+        return {"files": len(files), "errors": {}}
+    errors = {r["file"]: r["error"] for r in results if "error" in r}
+    return {"files": len(files), "changed": sum(1 for r in results if r.get("changed")), "errors": errors}
+
+
+def preload_workers():
+    """Install and start PRETTIER_PRELOAD versions in the background so startup is not delayed."""
+    def start(spec):
+        try:
+            get_worker(spec).format_files([])
+        except Exception as e:
+            print(f'could not start prettier worker for {spec}: {e}')
+
+    for spec in PRETTIER_PRELOAD:
+        threading.Thread(target=start, args=(spec,), daemon=True).start()
+
+
+def shutdown_workers():
+    with workers_lock:
+        for worker in workers.values():
+            worker.close()
+        workers.clear()
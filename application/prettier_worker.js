@@ -0,0 +1,50 @@
+// Long-lived Prettier worker for A2.
+// Usage: node prettier_worker.js <path to an installed prettier package>
+// Reads one JSON request per stdin line, {"id": 1, "files": ["/data/a.md"]}, formats the files in
+// place like `prettier --write`, and answers with one JSON line,
+// {"id": 1, "results": [{"file": "/data/a.md", "changed": true}]}.
+const fs = require("fs");
+const readline = require("readline");
+
+const prettier = require(process.argv[2]);
+
+async function formatFile(file) {
+  try {
+    const source = fs.readFileSync(file, "utf8");
+    const options = (await prettier.resolveConfig(file, { editorconfig: true })) || {};
+    // Prettier 3 returns a promise, Prettier 2 a string
+    const output = await prettier.format(source, { ...options, filepath: file });
+    if (output !== source) {
+      fs.writeFileSync(file, output);
+    }
+    return { file, changed: output !== source };
+  } catch (e) {
+    return { file, error: String((e && e.message) || e) };
+  }
+}
+
+async function handle(line) {
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (e) {
+    return { id: null, error: `Invalid request: ${e.message}` };
+  }
+  const results = [];
+  for (const file of request.files || []) {
+    results.push(await formatFile(file));
+  }
+  return { id: request.id, results };
+}
+
+// Requests are answered strictly in order
+let pending = Promise.resolve();
+const lines = readline.createInterface({ input: process.stdin });
+lines.on("line", (line) => {
+  pending = pending.then(async () => {
+    process.stdout.write(JSON.stringify(await handle(line)) + "\n");
+  });
+});
+lines.on("close", () => pending.then(() => process.exit(0)));
+
+process.stdout.write(JSON.stringify({ ready: prettier.version || null }) + "\n");
@@ -0,0 +1,220 @@
+# Local fast-path router: map recognizable tasks onto a tool call without the LLM
+import os
+import re
+import json
+import inspect
+from dotenv import load_dotenv
+load_dotenv()
+
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "1") != "0"
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.6"))
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Every group must match for a full keyword score; each group is one regex.
+TOOL_KEYWORDS = {
+    "A1": [r"datagen|\buv\b|\brun\b.*\bscript|\.py\b", r"https?://"],
+    "A2": [r"prettier", r"\bformat"],
+    "A3": [r"\b(monday|tuesday|wednesday|thursday|friday|saturday|sunday)s?\b", r"\bdates?\b", r"\bcount|\bnumber of|how many"],
+    "A4": [r"\bsort", r"\bcontacts?\b"],
+    "A5": [r"\blogs?\b", r"\brecent|\blatest|\bnewest"],
+    "A6": [r"\bdocs\b|markdown|\.md\b", r"\bindex\b", r"\bh1\b|\btitles?\b|\bheading"],
+    "A7": [r"\be-?mail\b", r"\bsender|\bfrom\b"],
+    "A8": [r"credit[\s_-]?card|card numbers?", r"\bimages?\b|\.png\b"],
+    "A9": [r"\bsimilar", r"\bcomments?\b"],
+    "A10": [r"\btickets?\b", r"\bgold\b", r"\bsales\b|\btotal\b"],
+    "B3": [r"\bfetch|\bdownload", r"https?://"],
+    "B4": [r"\bclone\b|\bgit\b|\brepo(sitory)?\b", r"https?://"],
+    "B5": [r"\bsql\b|\bquery\b|\bselect\b", r"\.db\b|\.duckdb\b|\bdatabase\b"],
+    "B6": [r"\bscrap(e|ing)\b|\bcrawl", r"https?://"],
+    "B7": [r"\bcompress|\bresize|\bthumbnail", r"\bimage\b|\.(png|jpe?g|webp)\b"],
+    "B8": [r"\btranscri(be|ption)", r"\baudio\b|\.mp3\b"],
+    "B9": [r"\bhtml\b", r"\bmarkdown\b|\.md\b", r"\bconvert|\brender"],
+}
+
+# Mentions that mean the task needs arguments the router cannot extract.
+TOOL_DEFER = {
+    # Any sort order other than the default last_name, then first_name
+    "A4": r"\bby\b(?!\s+last[_ ]?name\W+(?:and\s+|then\s+)*(?:by\s+)?first[_ ]?name\b)|\border\b|\bdesc|\breverse",
+    "B4": r"\bcommit\b|\bpush\b|\bmodify\b|\bchange",
+    "B6": r"\bselector\b|\belement|\bheader",
+    "B9": r"\bextensions?\b",
+}
+# Negations and corrections change the meaning in ways no schema argument captures.
+DEFER_ALWAYS = re.compile(r"\b(?:don'?t|do\s+not|does\s+not|not|never|instead|rather\s+than|except|excluding|exclude|but)\b",
+                          re.IGNORECASE)
+
+OUTPUT_HINT = re.compile(r"(\bto|\binto|\bsave|\bwrite|\boutput|\bas|\bin file|\bcreate|\bgenerate)\b[^/]{0,24}$",
+                         re.IGNORECASE)
+URL_RE = re.compile(r"https?://[^\s'\"<>]+")
+PATH_RE = re.compile(r"(?<![\w:/.])/[\w.\-/]+")
+# SQL is only taken from quotes/backticks or from an unquoted, upper-case SELECT ... FROM ...,
+# so English words like "with" or "select" in prose never become a query.
+QUOTED_SQL_RE = re.compile(r"([\"'`])\s*((?:SELECT|WITH)\b.*?\bFROM\b.*?)\1", re.IGNORECASE | re.DOTALL)
+SQL_RE = re.compile(
+    r"\bSELECT\s+\S.*?\s+FROM\s+[\w\"]+.*?"
+    r"(?=\s+(?:and\s+)?(?:save|write|store|output|export|put)\b"
+    r"|\s+(?:on|in|against|and|to|into|from)\s+(?:the\s+)?(?:database\s+|file\s+)?/"
+    r"|[.;](?:\s|$)|$)",
+    re.DOTALL,
+)
+SIZE_RE = re.compile(r"\b(\d+)\s*[x×*]\s*(\d+)\b")
+
+
+def _strip(token):
+    token = token.rstrip(".,;:)")
+    return token.rstrip("/") or token
+
+
+def _extension(pattern):
+    match = re.search(r"\\\.(\w+)\)?$", pattern)
+    return f".{match.group(1)}" if match else None
+
+
+def _path_compatible(pattern, value):
+    if re.fullmatch(pattern, value):
+        return True
+    extension = _extension(pattern)
+    return extension is not None and value.endswith(extension)
+
+
+def _extract(prompt):
+    """Pull URLs and file paths out of the prompt, tagging paths that read as an output target."""
+    urls = [_strip(m.group(0)) for m in URL_RE.finditer(prompt)]
+    masked = URL_RE.sub(lambda m: " " * len(m.group(0)), prompt)
+    paths = []
+    for m in PATH_RE.finditer(masked):
+        is_output = bool(OUTPUT_HINT.search(masked[max(0, m.start() - 30):m.start()]))
+        paths.append((_strip(m.group(0)), is_output))
+    return urls, paths, masked
+
+
+def keyword_scores(prompt):
+    scores = {}
+    for name, groups in TOOL_KEYWORDS.items():
+        matched = sum(1 for group in groups if re.search(group, prompt, re.IGNORECASE))
+        scores[name] = matched / len(groups)
+    return scores
+
+
+def _fill_arguments(definition, prompt, function=None):
+    """Fill a tool's parameters from the prompt. Returns (arguments, fill score, unused candidates)."""
+    properties = definition["parameters"].get("properties", {})
+    required = [p for p in definition["parameters"].get("required", []) if p in properties]
+    urls, paths, masked = _extract(prompt)
+    signature_defaults = {}
+    if function is not None:
+        signature_defaults = {
+            k: v.default for k, v in inspect.signature(function).parameters.items()
+            if v.default is not inspect.Parameter.empty
+        }
+
+    arguments, weights, used = {}, {}, set()
+    ambiguous = False  # The prompt names several values for one parameter
+    # Output-like parameters take output-looking paths first, everything else goes in prompt order.
+    ordered = sorted(properties, key=lambda p: not any(h in p for h in ("target", "output", "save")))
+    for prop in ordered:
+        spec = properties[prop]
+        pattern = spec.get("pattern")
+        if pattern is None and spec.get("type") == "string" and prop.endswith(("path", "filename", "file")):
+            pattern = ".*/.*"
+        wants_output = any(h in prop for h in ("target", "output", "save"))
+        value = None
+
+        if spec.get("type") == "string" and pattern and pattern.startswith("http"):
+            value = next((u for u in urls if u not in used and re.fullmatch(pattern, u)), None)
+        elif spec.get("type") == "string" and pattern and "/" in pattern:
+            # Output parameters only take paths the prompt marks as a target ("to", "save", ...),
+            # so an input file is never picked as the place to write
+            candidates = [p for p, out in paths if out == wants_output]
+            if not wants_output:
+                candidates += [p for p, out in paths if out]
+            value = next((p for p in candidates if p not in used and _path_compatible(pattern, p)), None)
+        elif "enum" in spec:
+            words = PATH_RE.sub(" ", masked)
+            found = {m.lower() for m in re.findall(r"\b(" + "|".join(map(re.escape, spec["enum"])) + r")\b", words, re.IGNORECASE)}
+            if len(found) > 1:
+                ambiguous = True
+            elif found:
+                value = next(e for e in spec["enum"] if e.lower() in found)
+        elif prop == "query":
+            # No confident match leaves the query to its default, or to the LLM when it has none
+            match = QUOTED_SQL_RE.search(prompt) or SQL_RE.search(masked)
+            if match:
+                value = (match.group(2) if match.re is QUOTED_SQL_RE else match.group(0)).strip().rstrip(";")
+        elif pattern and re.search(r"Monday", pattern):
+            found = {m.lower() for m in re.findall(pattern, prompt, re.IGNORECASE)}
+            if len(found) > 1:
+                ambiguous = True
+            elif found:
+                value = next(i + 1 for i, day in enumerate(WEEKDAYS) if day.lower() in found)
+        elif pattern and not pattern.startswith(".*"):
+            match = re.search(pattern, prompt)
+            if match:
+                value = match.group(0)
+        elif spec.get("type") == "array" and spec.get("items", {}).get("type") == "integer":
+            match = SIZE_RE.search(masked)
+            if match:
+                value = [int(match.group(1)), int(match.group(2))]
+        elif spec.get("type") == "integer":
+            match = re.search(r"\b(\d+)\b", PATH_RE.sub(" ", masked))
+            if match:
+                value = int(match.group(1))
+
+        if value is not None:
+            arguments[prop] = value
+            weights[prop] = 1.0
+            if isinstance(value, str):
+                used.add(value)
+        elif spec.get("default") is not None:
+            arguments[prop] = spec["default"]
+            weights[prop] = 0.8
+        elif prop in signature_defaults:
+            weights[prop] = 0.8  # Left out so the task's own default applies
+        elif prop in required:
+            weights[prop] = 0.0
+
+    scored = [weights.get(p, 0.0) for p in required]
+    fill = min(scored) * (sum(scored) / len(scored)) if scored else 1.0
+    # Reading and writing the same file would overwrite the input
+    paths_by_role = ({}, {})
+    for prop, value in arguments.items():
+        if isinstance(value, str) and value.startswith("/"):
+            paths_by_role[any(h in prop for h in ("target", "output", "save"))][prop] = value
+    inputs, outputs = (set(role.values()) for role in paths_by_role)
+    if ambiguous or outputs & inputs:
+        fill = 0.0
+    unused = [u for u in urls if u not in used] + [p for p, _ in paths if p not in used]
+    return arguments, fill, unused
+
+
+def route(prompt, function_definitions, functions=None, min_confidence=ROUTER_MIN_CONFIDENCE):
+    """
+    Classify a prompt locally.
+
+    Returns {"name", "arguments", "confidence"} like a tool call from the LLM, or None when the
+    best candidate scores below min_confidence and the caller should fall back to the LLM.
+    """
+    if not ROUTER_ENABLED:
+        return None
+    scores = keyword_scores(prompt)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best, best_score), (_, second_score) = ranked[0], ranked[1]
+    if best_score == 0 or (best in TOOL_DEFER and re.search(TOOL_DEFER[best], prompt, re.IGNORECASE)):
+        return None
+    if DEFER_ALWAYS.search(prompt):
+        return None
+
+    definition = next((d for d in function_definitions if d["name"] == best), None)
+    if definition is None:
+        return None
+    function = (functions or {}).get(best)
+    arguments, fill, unused = _fill_arguments(definition, prompt, function)
+
+    margin = (best_score - second_score) / best_score
+    confidence = best_score * fill * (0.5 + 0.5 * margin)
+    if unused:
+        confidence *= 0.5  # The prompt mentions paths or URLs we could not place
+    if confidence < min_confidence:
+        return None
+    return {"name": best, "arguments": json.dumps(arguments), "confidence": round(confidence, 3)}
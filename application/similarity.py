@@ -0,0 +1,91 @@
+# Memory-bounded most-similar-pair search for A9
+import os
+import heapq
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+SIMILARITY_BLOCK_SIZE = int(os.getenv("SIMILARITY_BLOCK_SIZE", "2048"))
+# Approximate search only kicks in above this many rows; smaller inputs always run exact
+APPROX_MIN_ROWS = int(os.getenv("SIMILARITY_APPROX_MIN_ROWS", "20000"))
+APPROX_TABLES = 8
+APPROX_BUCKET_SIZE = 512
+
+
+def _tile_best(embeddings, row_start, row_end, col_start, col_end, top_k):
+    """Best (score, i, j) pairs with i < j inside one tile of the similarity matrix."""
+    tile = embeddings[row_start:row_end] @ embeddings[col_start:col_end].T
+    rows = np.arange(row_start, row_end)[:, None]
+    cols = np.arange(col_start, col_end)[None, :]
+    tile[cols <= rows] = -np.inf
+    if top_k == 1:
+        flat = int(np.argmax(tile))  # First maximum in row-major order, like a full-matrix argmax
+        candidates = [flat]
+    else:
+        k = min(top_k, tile.size)
+        candidates = np.argpartition(tile, -k, axis=None)[-k:]
+    best = []
+    for flat in candidates:
+        r, c = divmod(int(flat), tile.shape[1])
+        if np.isfinite(tile[r, c]):
+            best.append((float(tile[r, c]), row_start + r, col_start + c))
+    return best
+
+
+def _row_block_best(embeddings, row_start, row_end, top_k, block_size):
+    n = len(embeddings)
+    best = []
+    for col_start in range(row_start, n, block_size):
+        best.extend(_tile_best(embeddings, row_start, row_end, col_start, min(col_start + block_size, n), top_k))
+    return best
+
+
+def _top(pairs, top_k):
+    # Highest score first; ties go to the smallest (i, j)
+    return heapq.nsmallest(top_k, pairs, key=lambda p: (-p[0], p[1], p[2]))
+
+
+def exact_pairs(embeddings, top_k=1, block_size=SIMILARITY_BLOCK_SIZE, workers=None):
+    """Exact top-k pairs by dot product, computed tile by tile so memory stays O(block_size^2)."""
+    n = len(embeddings)
+    starts = range(0, n, block_size)
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        blocks = pool.map(lambda s: _row_block_best(embeddings, s, min(s + block_size, n), top_k, block_size), starts)
+        pairs = [pair for block in blocks for pair in _top(block, top_k)]
+    return _top(pairs, top_k)
+
+
+def approximate_pairs(embeddings, top_k=1, block_size=SIMILARITY_BLOCK_SIZE, workers=None, seed=0):
+    """
+    Random-projection LSH: rows sharing a hash bucket in any table are compared exactly.
+    Close pairs collide in at least one table with high probability.
+    """
+    n, dim = embeddings.shape
+    bits = max(1, int(np.ceil(np.log2(max(n / APPROX_BUCKET_SIZE, 2)))))
+    rng = np.random.default_rng(seed)
+    buckets = []
+    for _ in range(APPROX_TABLES):
+        planes = rng.standard_normal((dim, bits)).astype(np.float32)
+        codes = ((embeddings @ planes) > 0) @ (1 << np.arange(bits))
+        order = np.argsort(codes, kind="stable")
+        boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+        buckets.extend(np.sort(members) for members in np.split(order, boundaries) if len(members) > 1)
+
+    def bucket_best(members):
+        pairs = exact_pairs(embeddings[members], top_k, block_size, workers=1)
+        return [(score, int(members[i]), int(members[j])) for score, i, j in pairs]
+
+    found = {}
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for pairs in pool.map(bucket_best, buckets):
+            for score, i, j in pairs:
+                found[(i, j)] = score
+    return _top([(score, i, j) for (i, j), score in found.items()], top_k)
+
+
+def most_similar_pairs(embeddings, top_k=1, approximate=False, block_size=SIMILARITY_BLOCK_SIZE, workers=None):
+    """Top-k (score, i, j) pairs with i < j, best first. Embeddings are compared in float32."""
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if approximate and len(embeddings) > APPROX_MIN_ROWS:
+        return approximate_pairs(embeddings, top_k, block_size, workers)
+    return exact_pairs(embeddings, top_k, block_size, workers)
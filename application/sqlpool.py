@@ -0,0 +1,261 @@
+# Pooled, read-only SQLite access with result memoization and a DuckDB engine for A10 and B5
+import os
+import re
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote
+from dotenv import load_dotenv
+load_dotenv()
+
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+SQLITE_RESULT_CACHE_SIZE = int(os.getenv("SQLITE_RESULT_CACHE_SIZE", "256"))
+# Streamed results are memoized only when they stay below this many rows
+SQLITE_MEMO_MAX_ROWS = int(os.getenv("SQLITE_MEMO_MAX_ROWS", "10000"))
+# immutable=1 skips all locking; only safe when nothing else ever writes the database files
+SQLITE_IMMUTABLE = os.getenv("SQLITE_IMMUTABLE", "0") == "1"
+
+# Auto engine selection: analytic queries over files at least this large go to DuckDB
+DUCKDB_MIN_BYTES = int(os.getenv("DUCKDB_MIN_BYTES", str(64 * 1024 * 1024)))
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", str(os.cpu_count() or 1)))
+
+ANALYTIC_QUERY_RE = re.compile(r"\b(SUM|AVG|COUNT|MIN|MAX|MEDIAN|STDDEV\w*|GROUP\s+BY|JOIN|DISTINCT|WINDOW|OVER)\b", re.IGNORECASE)
+READ_QUERY_RE = re.compile(r"^\s*(?:--[^\n]*\n\s*|/\*.*?\*/\s*)*(SELECT|WITH|VALUES|EXPLAIN)\b", re.IGNORECASE | re.DOTALL)
+
+
+def is_read_query(query):
+    return bool(READ_QUERY_RE.match(query))
+
+
+def file_identity(path):
+    """(device, inode) of the database file, which changes when the file is replaced or recreated."""
+    st = os.stat(path)
+    return st.st_dev, st.st_ino
+
+
+def file_version(path):
+    """Identity plus (mtime_ns, size) of the database and its WAL, which changes whenever the data does."""
+    version = []
+    for p in (path, f"{path}-wal"):
+        try:
+            st = os.stat(p)
+            version.extend((st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            version.extend((None, None, None, None))
+    return tuple(version)
+
+
+class ConnectionPool:
+    """A fixed number of read-only connections to one database file, shared across threads."""
+
+    def __init__(self, path, size=SQLITE_POOL_SIZE, immutable=SQLITE_IMMUTABLE):
+        self.path = path
+        self.size = size
+        self.immutable = immutable
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        uri = f"file:{quote(self.path)}?mode=ro" + ("&immutable=1" if self.immutable else "")
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE)
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                grow = self.created < self.size
+                if grow:
+                    self.created += 1
+            if grow:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self.lock:
+                        self.created -= 1
+                    raise
+            else:
+                conn = self.idle.get()
+        try:
+            yield conn
+        finally:
+            if self.closed:
+                conn.close()  # The pool was replaced while this connection was in use
+            else:
+                self.idle.put(conn)
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+pools = {}
+pools_lock = threading.Lock()
+results = OrderedDict()
+results_lock = threading.Lock()
+
+
+def get_pool(path):
+    path = os.path.realpath(path)
+    # Open connections keep reading a replaced file's old inode, so pools are tied to the file's
+    # identity. Immutable connections never notice any change, so they are tied to one version.
+    key = (path, file_version(path) if SQLITE_IMMUTABLE else file_identity(path))
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None:
+            for stale in [k for k in pools if k[0] == path]:
+                pools.pop(stale).close()
+            pool = pools[key] = ConnectionPool(path)
+        return pool
+
+
+duckdb_databases = {}
+duckdb_lock = threading.Lock()
+
+
+def duckdb_cursor(path):
+    """
+    A DuckDB cursor with the SQLite file attached read-only through the sqlite scanner,
+    so queries run on DuckDB's parallel vectorized executor. One attached database is
+    shared per file version; each caller gets its own cursor for thread safety.
+
+    A stale version is only dropped from the cache, never closed: cursors keep their
+    database alive, so queries still running on other threads finish and the old
+    database is released once the last of them is closed.
+    """
+    import duckdb
+    path = os.path.realpath(path)
+    version = file_version(path)
+    with duckdb_lock:
+        cached = duckdb_databases.get(path)
+        if cached is None or cached[0] != version:
+            conn = duckdb.connect()
+            conn.execute(f"SET threads = {DUCKDB_THREADS}")
+            quoted = "'" + path.replace("'", "''") + "'"
+            conn.execute(f"ATTACH {quoted} AS db (TYPE SQLITE, READ_ONLY)")
+            duckdb_databases[path] = cached = (version, conn)
+        cursor = cached[1].cursor()
+    # USE is per connection and a cursor is a new connection, so each one selects db itself
+    cursor.execute("USE db")
+    return cursor
+
+
+def choose_engine(path, query, engine="auto"):
+    """'sqlite' or 'duckdb'. auto picks DuckDB for analytic reads over large files."""
+    if engine in ("sqlite", "duckdb"):
+        return engine
+    if engine != "auto":
+        raise ValueError(f"Unknown engine {engine!r}; use auto, sqlite or duckdb")
+    if is_read_query(query) and ANALYTIC_QUERY_RE.search(query) and os.path.getsize(path) >= DUCKDB_MIN_BYTES:
+        return "duckdb"
+    return "sqlite"
+
+
+def read_query(path, query, params=(), use_cache=True, engine="sqlite"):
+    """
+    Run a read-only query through the pool (or DuckDB) and return all rows.
+
+    Results are memoized by (db path, query, params, file version), so any write to the
+    database or its WAL invalidates them.
+    """
+    path = os.path.realpath(path)
+    key = (path, query, tuple(params), file_version(path), engine)
+    if use_cache:
+        with results_lock:
+            if key in results:
+                results.move_to_end(key)
+                return results[key]
+
+    if engine == "duckdb":
+        cursor = duckdb_cursor(path)
+        try:
+            rows = cursor.execute(query, list(params)).fetchall()
+        finally:
+            cursor.close()
+    else:
+        with get_pool(path).connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+    if use_cache:
+        _remember(key, rows)
+    return rows
+
+
+def _remember(key, value):
+    with results_lock:
+        results[key] = value
+        while len(results) > SQLITE_RESULT_CACHE_SIZE:
+            results.popitem(last=False)
+
+
+@contextmanager
+def stream_query(path, query, params=(), batch_size=10000, use_cache=True):
+    """
+    Run a read-only query and yield (columns, batches), where batches is an iterator of
+    fetchmany() row lists. Small results are memoized like read_query.
+    """
+    path = os.path.realpath(path)
+    key = ("stream", path, query, tuple(params), file_version(path))
+    if use_cache:
+        with results_lock:
+            hit = results.get(key)
+            if hit is not None:
+                results.move_to_end(key)
+        if hit is not None:
+            columns, rows = hit
+            yield columns, (rows[i:i + batch_size] for i in range(0, len(rows), batch_size))
+            return
+
+    with get_pool(path).connection() as conn:
+        cursor = conn.execute(query, params)
+        columns = [d[0] for d in cursor.description or ()]
+        kept = []
+
+        def batches():
+            nonlocal kept
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if kept is not None:
+                    kept.extend(rows)
+                    if len(kept) > SQLITE_MEMO_MAX_ROWS:
+                        kept = None
+                yield rows
+            if use_cache and kept is not None:
+                _remember(key, (columns, kept))
+
+        try:
+            yield columns, batches()
+        finally:
+            cursor.close()
+
+
+def run_query(path, query, engine="auto", use_cache=True):
+    """read_query with engine selection. Returns (rows, engine actually used)."""
+    chosen = choose_engine(path, query, engine)
+    if chosen == "duckdb":
+        try:
+            return read_query(path, query, use_cache=use_cache, engine="duckdb"), "duckdb"
+        except Exception as e:
+            if engine == "duckdb":
+                raise
+            # auto: the sqlite scanner may be unavailable (e.g. offline), so fall back
+            print(f"DuckDB engine unavailable, using sqlite: {e}")
+    return read_query(path, query, use_cache=use_cache), "sqlite"
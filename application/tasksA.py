@@ -1,17 +1,25 @@
 from fastapi import HTTPException
-import sqlite3
 import subprocess
-from dateutil.parser import parse
 from datetime import datetime
 import json
 from pathlib import Path
+from email.utils import parseaddr
 import os
-import requests
 import shutil
+import glob
 from scipy.spatial.distance import cosine
 from dotenv import load_dotenv
-import numpy as np
+import heapq
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from .tasksB import B1
+from .dates import count_weekdays
+from .extsort import external_sort_json
+from .vision import ask_image, CARD_PROMPT
+from .embeddings import get_embeddings
+from .similarity import most_similar_pairs
+from .sqlpool import run_query
+from .prettier import format_files
 load_dotenv()
 
 AIPROXY_TOKEN = os.getenv('AIPROXY_TOKEN')
@@ -48,175 +56,284 @@ async def A1(email="22f3000819@ds.study.iitm.ac.in", script_url="https://raw.git
         raise HTTPException(status_code=500, detail=str(e))
 # A1()
 async def A2(prettier_version="prettier@3.4.2", filename="/data/format.md"):
+    """
+    Format a file in place with a resident Prettier worker for the version. filename may also be
+    a directory (every .md file under it) or a glob pattern, formatted in one batch request.
+    """
     B1(filepath=filename)
-    command = ["npx", "--yes", prettier_version, "--write", filename]
+    if os.path.isdir(filename):
+        files = sorted(path for path, _, _ in _scan_markdown(filename))
+    elif any(c in filename for c in "*?["):
+        files = sorted(p for p in glob.glob(filename, recursive=True) if os.path.isfile(p))
+    else:
+        files = [filename]
     try:
-        subprocess.run(command, check=True)
+        result = format_files(files, prettier_version)
+        for path, error in result["errors"].items():
+            print(f"An error occurred in {path}: {error}")
         print("Prettier executed successfully.")
+        return result
     except subprocess.CalledProcessError as e:
         print(f"An error occurred: {e}")
 
-def A3(filename='/data/dates.txt', targetfile='/data/dates-wednesdays.txt', weekday=2):
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+def A3(filename='/data/dates.txt', targetfile='/data/dates-wednesdays.txt', weekday=2, all_weekdays=False, workers=None):
     input_file = filename
     output_file = targetfile
-    weekday = weekday
-    weekday_count = 0
     B1(filepath=input_file)
     B1(filepath=targetfile)
-    with open(input_file, 'r') as file:
-        weekday_count = sum(1 for date in file if parse(date).weekday() == int(weekday)-1)
-
+    # weekday is 1-based (Monday=1); accept a day name too
+    if isinstance(weekday, str) and not weekday.strip().isdigit():
+        weekday = [d.lower() for d in WEEKDAY_NAMES].index(weekday.strip().lower().rstrip('s')) + 1
+    counts = count_weekdays(input_file, workers=workers)
+    weekday_count = int(counts[int(weekday)-1])
 
     with open(output_file, 'w') as file:
-        file.write(str(weekday_count))
+        if all_weekdays:
+            json.dump({day: int(n) for day, n in zip(WEEKDAY_NAMES, counts)}, file, indent=4)
+        else:
+            file.write(str(weekday_count))
+    return {day: int(n) for day, n in zip(WEEKDAY_NAMES, counts)} if all_weekdays else weekday_count
 
-def A4(filename="/data/contacts.json", targetfile="/data/contacts-sorted.json"):
+A4_STREAMING_MIN_BYTES = int(os.getenv('A4_STREAMING_MIN_BYTES', str(256 * 1024 * 1024)))
+
+def A4(filename="/data/contacts.json", targetfile="/data/contacts-sorted.json", keys=("last_name", "first_name"),
+       streaming=None, run_size=100_000):
     B1(filepath=filename)
     B1(filepath=targetfile)
+    # Sort the contacts by last_name and then by first_name (or the requested keys)
+    sort_key = lambda x: tuple(x[k] for k in keys)
+
+    # Large files go through an external merge sort with flat memory use
+    if streaming is None:
+        streaming = os.path.getsize(filename) >= A4_STREAMING_MIN_BYTES
+    if streaming:
+        count = external_sort_json(filename, targetfile, sort_key, run_size=run_size)
+        return {"sorted": count, "streaming": True}
+
     # Load the contacts from the JSON file
     with open(filename, 'r') as file:
         contacts = json.load(file)
 
-    # Sort the contacts by last_name and then by first_name
-    sorted_contacts = sorted(contacts, key=lambda x: (x['last_name'], x['first_name']))
+    sorted_contacts = sorted(contacts, key=sort_key)
 
     # Write the sorted contacts to the new JSON file
     with open(targetfile, 'w') as file:
         json.dump(sorted_contacts, file, indent=4)
 
-def A5(log_dir_path='/data/logs', output_file_path='/data/logs-recent.txt', num_files=10):
-    B1(filepath=log_dir_path)
-    B1(filepath=output_file_path)
-    log_dir = Path(log_dir_path)
-    output_file = Path(output_file_path)
+# Persistent per-directory state lives outside /data; an empty value disables it
+TASK_STATE_DIR = os.getenv('TASK_STATE_DIR', os.path.expanduser('~/.cache/tdsp1/tasks'))
 
-    # Get list of .log files sorted by modification time (most recent first)
-    log_files = sorted(log_dir.glob('*.log'), key=os.path.getmtime, reverse=True)[:num_files]
+def _state_path(kind, *keys):
+    """Default location of a task's index/manifest for the given directories, or None if disabled."""
+    if not TASK_STATE_DIR:
+        return None
+    digest = hashlib.sha256('\0'.join(os.path.realpath(k) for k in keys).encode('utf-8')).hexdigest()[:16]
+    os.makedirs(TASK_STATE_DIR, exist_ok=True)
+    return os.path.join(TASK_STATE_DIR, f'{kind}-{digest}.json')
 
-    # Read first line of each file and write to the output file
-    with output_file.open('w') as f_out:
-        for log_file in log_files:
-            with log_file.open('r') as f_in:
-                first_line = f_in.readline().strip()
-                f_out.write(f"{first_line}\n")
+def _first_line(path):
+    with open(path, 'r') as f_in:
+        return f_in.readline().strip()
 
-def A6(doc_dir_path='/data/docs', output_file_path='/data/docs/index.json'):
+def A5(log_dir_path='/data/logs', output_file_path='/data/logs-recent.txt', num_files=10, index_path=None, workers=8):
+    B1(filepath=log_dir_path)
+    B1(filepath=output_file_path)
+    num_files = int(num_files)
+
+    # Persistent index: name -> [mtime_ns, size, first_line], reused for unchanged files
+    index = {}
+    if index_path:
+        B1(filepath=index_path)
+    else:
+        index_path = _state_path('a5-index', log_dir_path)
+    if index_path:
+        if os.path.exists(index_path):
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+
+    # Single scandir pass; DirEntry caches its stat result
+    entries = []
+    with os.scandir(log_dir_path) as it:
+        for entry in it:
+            if entry.name.endswith('.log') and not entry.name.startswith('.') and entry.is_file():
+                st = entry.stat()
+                entries.append((st.st_mtime_ns, entry.name, st.st_size))
+
+    # Bounded selection of the most recent files instead of a full sort
+    recent = heapq.nlargest(num_files, entries)
+
+    # Read first lines concurrently, skipping files the index already has
+    stale = [(name, mtime, size) for mtime, name, size in recent
+             if index.get(name, [None, None])[:2] != [mtime, size]]
+    if stale:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(stale)))) as pool:
+            lines = pool.map(_first_line, [os.path.join(log_dir_path, name) for name, _, _ in stale])
+            for (name, mtime, size), line in zip(stale, lines):
+                index[name] = [mtime, size, line]
+
+    # Write first lines to the output file, most recent first
+    with open(output_file_path, 'w') as f_out:
+        for _, name, _ in recent:
+            f_out.write(f"{index[name][2]}\n")
+
+    if index_path and stale:
+        present = {name for _, name, _ in entries}
+        index = {name: value for name, value in index.items() if name in present}
+        with open(f"{index_path}.tmp", 'w') as f:
+            json.dump(index, f)
+        os.replace(f"{index_path}.tmp", index_path)
+
+A6_PREFIX_BYTES = int(os.getenv('A6_PREFIX_BYTES', str(64 * 1024)))
+
+def _first_h1(file_path, max_bytes=A6_PREFIX_BYTES):
+    """Title of the first H1 within the first max_bytes of a markdown file, or None."""
+    read = 0
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('# '):
+                # Extract the title text after '# '
+                return line[2:].strip()
+            read += len(line)
+            if read >= max_bytes:
+                break
+    return None
+
+def _scan_markdown(docs_dir):
+    """Recursively yield (path, mtime_ns, size) for .md files using scandir's cached entries."""
+    stack = [docs_dir]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.md') and entry.is_file():
+                    st = entry.stat()
+                    yield entry.path, st.st_mtime_ns, st.st_size
+
+def A6(doc_dir_path='/data/docs', output_file_path='/data/docs/index.json', incremental=True, manifest_path=None, workers=8):
     B1(filepath=doc_dir_path)
     B1(filepath=output_file_path)
     docs_dir = doc_dir_path
     output_file = output_file_path
-    index_data = {}
     print(docs_dir, output_file)
-    # Walk through all files in the docs directory
-    for root, _, files in os.walk(docs_dir):
-        for file in files:
-            if file.endswith('.md'):
-                # print(file)
-                file_path = os.path.join(root, file)
-                # Read the file and find the first occurrence of an H1
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        if line.startswith('# '):
-                            # Extract the title text after '# '
-                            title = line[2:].strip()
-                            # Get the relative path without the prefix
-                            relative_path = os.path.relpath(file_path, docs_dir).replace('\\', '/')
-                            index_data[relative_path] = title
-                            break  # Stop after the first H1
+
+    # Manifest: relative path -> [mtime_ns, size, title]; unchanged files reuse their title
+    manifest = {}
+    if incremental and manifest_path:
+        B1(filepath=manifest_path)
+    elif incremental:
+        manifest_path = _state_path('a6-manifest', docs_dir)
+        incremental = manifest_path is not None
+    if incremental:
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+
+    files = {}
+    changed = []
+    for file_path, mtime, size in _scan_markdown(docs_dir):
+        # Get the relative path without the prefix
+        relative_path = os.path.relpath(file_path, docs_dir).replace('\\', '/')
+        files[relative_path] = (file_path, mtime, size)
+        if manifest.get(relative_path, [None, None])[:2] != [mtime, size]:
+            changed.append(relative_path)
+
+    # Read changed files in a thread pool, stopping at a bounded prefix
+    if changed:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(changed)))) as pool:
+            titles = pool.map(_first_h1, [files[rel][0] for rel in changed])
+            for rel, title in zip(changed, titles):
+                _, mtime, size = files[rel]
+                manifest[rel] = [mtime, size, title]
+
+    manifest = {rel: manifest[rel] for rel in sorted(files)}
+    index_data = {rel: entry[2] for rel, entry in manifest.items() if entry[2] is not None}
+
     # Write the index data to index.json
-    # print(index_data)
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(index_data, f, indent=4)
 
-def A7(filename='/data/email.txt', output_file='/data/email-sender.txt'):
+    if incremental:
+        with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+    return {"files": len(files), "reindexed": len(changed)}
+
+def read_email_headers(filename):
+    """Parse only the RFC 822 header block: stop at the first blank line and unfold continuation lines."""
+    headers = []
+    with open(filename, 'r', errors='replace') as file:
+        for line in file:
+            line = line.rstrip('\r\n')
+            if not line:
+                break
+            if line[0] in ' \t' and headers:
+                headers[-1] = (headers[-1][0], headers[-1][1] + ' ' + line.strip())
+            elif ':' in line:
+                name, value = line.split(':', 1)
+                headers.append((name.strip(), value.strip()))
+    return headers
+
+def extract_sender(filename, default="sujay@gmail.com"):
+    for name, value in read_email_headers(filename):
+        if name.lower() == 'from':
+            address = parseaddr(value)[1]
+            return address or value.split(" ")[-1].replace("<", "").replace(">", "")
+    return default
+
+def A7(filename='/data/email.txt', output_file='/data/email-sender.txt', pattern='*', workers=16):
     B1(filepath=filename)
     B1(filepath=output_file)
-    # Read the content of the email
-    with open(filename, 'r') as file:
-        email_content = file.readlines()
 
-    sender_email = "sujay@gmail.com"
-    for line in email_content:
-        if "From" == line[:4]:
-            sender_email = (line.strip().split(" ")[-1]).replace("<", "").replace(">", "")
-            break
+    # Batch mode: a directory of emails -> one "name<TAB>sender" line per email
+    if os.path.isdir(filename):
+        paths = sorted(p for p in Path(filename).glob(pattern) if p.is_file())
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            senders = list(pool.map(extract_sender, paths))
+        with open(output_file, 'w') as file:
+            for path, sender in zip(paths, senders):
+                file.write(f"{path.relative_to(filename).as_posix()}\t{sender}\n")
+        return {"emails": len(paths)}
 
-    # Get the extracted email address
+    sender_email = extract_sender(filename)
 
     # Write the email address to the output file
     with open(output_file, 'w') as file:
         file.write(sender_email)
+    return sender_email
 
-import base64
-def png_to_base64(image_path):
-    with open(image_path, "rb") as image_file:
-        base64_string = base64.b64encode(image_file.read()).decode('utf-8')
-    return base64_string
+def extract_card_number(image_path, use_cache=True):
+    return ask_image(image_path, CARD_PROMPT, use_cache=use_cache).replace(" ", "")
 
-def A8(filename='/data/credit_card.txt', image_path='/data/credit_card.png'):
+def A8(filename='/data/credit_card.txt', image_path='/data/credit_card.png', pattern='*.png', workers=4, use_cache=True):
     print('checking filename')
     B1(filepath=filename)
     print('checking image path')
     B1(filepath=image_path)
-    # Construct the request body for the AIProxy call
-    print('creating body')
-    body = {
-        "model": "gpt-4o-mini",
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "There may be multiple lines of texts in the image. Extract the line which has 8 or 12 or 16 digits one after the other and may have space in between. Then extract those 16 digits 1 by 1 from the left and create a string of length 16 having only those digits. Return only that string of digits and no other additional text. Just the string of digits."
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{png_to_base64(image_path)}"
-                        }
-                    }
-                ]
-            }
-        ]
-    }
-    print('creating headers')
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {AIPROXY_TOKEN}"
-    }
-    print('making request')
-    # Make the request to the AIProxy service
-    response = requests.post("http://aiproxy.sanand.workers.dev/openai/v1/chat/completions",
-                             headers=headers, data=json.dumps(body))
-    print(f'got response {response.status_code}')
-    # Extract the credit card number from the response
-    result = response.json()
-    # print(result); return None
-    card_number = result['choices'][0]['message']['content'].replace(" ", "")
+
+    # Batch mode: a directory of card images -> one "name<TAB>number" line per image
+    if os.path.isdir(image_path):
+        images = sorted(p for p in Path(image_path).glob(pattern) if p.is_file())
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            numbers = list(pool.map(lambda p: extract_card_number(p, use_cache), images))
+        with open(filename, 'w') as file:
+            for path, number in zip(images, numbers):
+                file.write(f"{path.relative_to(image_path).as_posix()}\t{number}\n")
+        return {"images": len(images)}
+
+    # The image is downscaled and grayscaled before upload; identical images hit the cache
+    card_number = extract_card_number(image_path, use_cache)
     print('writing to file')
     # Write the extracted card number to the output file
     with open(filename, 'w') as file:
         file.write(card_number)
     print('written')
+    return card_number
 # A8()
 
-def get_embeddings(texts):
-    """Fetch embeddings for a batch of texts in a single request."""
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {AIPROXY_TOKEN}"
-    }
-    data = {
-        "model": "text-embedding-3-small",
-        "input": texts  # Send all comments at once
-    }
-    response = requests.post("http://aiproxy.sanand.workers.dev/openai/v1/embeddings", headers=headers, data=json.dumps(data))
-    if response.status_code >= 400:
-        raise HTTPException(status_code=response.status_code, detail=f"Embeddings API request failed with status {response.status_code}: {response.text}")
-    return np.array([emb["embedding"] for emb in response.json()["data"]])
-
-async def A9(filename='/data/comments.txt', output_filename='/data/comments-similar.txt'):
+async def A9(filename='/data/comments.txt', output_filename='/data/comments-similar.txt', top_k=1, approximate=False, embedding_backend=None):
     B1(filepath=filename)
     B1(filepath=output_filename)
     """Find the most similar pair of comments using embeddings."""
@@ -230,29 +347,26 @@ async def A9(filename='/data/comments.txt', output_filename='/data/comments-simi
         print("Not enough comments to compare.")
         return
 
-    print('Fetching embeddings in a single request...')
-    embeddings = get_embeddings(comments)
-    similarity = np.dot(embeddings, embeddings.T)
-    # Create mask to ignore diagonal (self-similarity)
-    np.fill_diagonal(similarity, -np.inf)
-    # Get indices of maximum similarity
-    i, j = np.unravel_index(similarity.argmax(), similarity.shape)
-    expected = "\n".join(sorted([comments[i], comments[j]]))
+    print('Fetching embeddings...')
+    embeddings = get_embeddings(comments, backend=embedding_backend)
+    # Blocked search over row tiles; the full n x n matrix is never built
+    pairs = most_similar_pairs(embeddings, top_k=int(top_k), approximate=approximate)
+    # One pair per block of two lines, most similar first
+    expected = "\n\n".join("\n".join(sorted([comments[i], comments[j]])) for _, i, j in pairs)
     with open(output_filename, 'w') as f:
         f.write(expected)
 
     print('Task completed.')
 
-def A10(filename='/data/ticket-sales.db', output_filename='/data/ticket-sales-gold.txt', query="SELECT SUM(units * price) FROM tickets WHERE type = 'Gold'"):
+def A10(filename='/data/ticket-sales.db', output_filename='/data/ticket-sales-gold.txt', query="SELECT SUM(units * price) FROM tickets WHERE type = 'Gold'", engine="auto"):
     B1(filepath=filename)
     B1(filepath=output_filename)
-    # Connect to the SQLite database
-    conn = sqlite3.connect(filename)
-    cursor = conn.cursor()
+    # Shared read-only connection pool (or DuckDB for large analytic queries);
+    # repeated queries on an unchanged file are memoized
+    rows, engine = run_query(filename, query, engine)
 
     # Calculate the total sales for the "Gold" ticket type
-    cursor.execute(query)
-    total_sales = cursor.fetchone()[0]
+    total_sales = rows[0][0] if rows else None
 
     # If there are no sales, set total_sales to 0
     total_sales = total_sales if total_sales else 0
@@ -260,6 +374,4 @@ def A10(filename='/data/ticket-sales.db', output_filename='/data/ticket-sales-go
     # Write the total sales to the file
     with open(output_filename, 'w') as file:
         file.write(str(total_sales))
-
-    # Close the database connection
-    conn.close()
+    return {"result": total_sales, "engine": engine}
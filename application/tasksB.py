@@ -2,12 +2,22 @@
 
 # B1 & B2: Security Checks
 import os
+import re
 from fastapi import HTTPException
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urljoin
 import subprocess
 import requests
 from bs4 import BeautifulSoup
 import json
+import csv
+import hashlib
+import time
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from .sqlpool import stream_query, is_read_query, choose_engine, duckdb_cursor
+from .transcribe import run_in_worker, transcribe_file, transcribe_batch
 
 def B1(filepath):
     abs_path = os.path.abspath(filepath)
@@ -15,57 +25,128 @@ def B1(filepath):
         raise HTTPException(status_code=403, detail='Access to files outside /data is prohibited.')
 
 # B3: Fetch Data from an API
-def B3(api_url, save_path):
-    B1(save_path)
-    import csv
-    import io
+B3_CHUNK_SIZE = int(os.getenv("B3_CHUNK_SIZE", str(1024 * 1024)))
+B3_VALIDATORS_PATH = os.getenv("B3_VALIDATORS_PATH", os.path.expanduser("~/.cache/tdsp1/b3-validators.json"))
+
+session = requests.Session()
+validators_lock = threading.Lock()
+
+def _load_validators():
+    try:
+        with open(B3_VALIDATORS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _save_validator(key, entry):
+    with validators_lock:
+        validators = _load_validators()
+        validators[key] = entry
+        os.makedirs(os.path.dirname(B3_VALIDATORS_PATH) or ".", exist_ok=True)
+        with open(f"{B3_VALIDATORS_PATH}.tmp", "w", encoding="utf-8") as f:
+            json.dump(validators, f)
+        os.replace(f"{B3_VALIDATORS_PATH}.tmp", B3_VALIDATORS_PATH)
+
+def _reformat(save_path, content_type):
+    """Optional post-processing: re-serialize structured formats for readability."""
     import xml.etree.ElementTree as ET
-    import yaml
+    tmp_path = f"{save_path}.fmt"
+    if "application/json" in content_type:
+        with open(save_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+    elif "text/xml" in content_type or "application/xml" in content_type:
+        ET.parse(save_path).write(tmp_path)
+    elif "text/csv" in content_type:
+        with open(save_path, "r", newline="", encoding="utf-8") as src, open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(csv.reader(src))
+    elif "html" in content_type:
+        with open(save_path, "r", encoding="utf-8") as f:
+            soup = BeautifulSoup(f.read(), "html.parser")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(soup.prettify())  # Save a prettified HTML file
+    elif "application/x-yaml" in content_type or "text/yaml" in content_type:
+        import yaml
+        with open(save_path, "r", encoding="utf-8") as f:
+            yaml_data = yaml.safe_load(f)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            yaml.dump(yaml_data, f, default_flow_style=False)
+    else:
+        return False  # Text and binary content is kept byte for byte
+    os.replace(tmp_path, save_path)
+    return True
+
+def B3(api_url, save_path, reformat=False, resume=True, conditional=True, timeout=60):
+    """
+    Stream a URL to save_path through a temp file.
+
+    Interrupted downloads resume with a Range request. Unchanged resources are skipped
+    using the ETag / Last-Modified seen last time. reformat=True re-serializes JSON, XML,
+    CSV, HTML and YAML afterwards.
+    """
+    B1(save_path)
+    part_path = f"{save_path}.part"
+    # Validators are remembered per (URL, target file)
+    key = f"{api_url} {os.path.abspath(save_path)}"
+    entry = _load_validators().get(key, {})
     try:
-        response = requests.get(api_url)
-        if response.status_code >= 400:
-            raise HTTPException(status_code=response.status_code, detail=f"API request failed with status {response.status_code}: {response.text}")  # Raise an error for bad responses (4xx and 5xx)
-        
-        content_type = response.headers.get("Content-Type", "").lower()
-        
-        if "application/json" in content_type:
-            data = response.json()
-            with open(save_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=4)
-        
-        elif "text/xml" in content_type or "application/xml" in content_type:
-            tree = ET.ElementTree(ET.fromstring(response.text))
-            tree.write(save_path)
-        
-        elif "text/csv" in content_type:
-            csv_reader = csv.reader(io.StringIO(response.text))
-            with open(save_path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerows(csv_reader)
-        
-        elif "text/plain" in content_type:
-            with open(save_path, "w", encoding="utf-8") as f:
-                f.write(response.text)
-        
-        elif "html" in content_type:
-            soup = BeautifulSoup(response.text, "html.parser")
-            with open(save_path, "w", encoding="utf-8") as f:
-                f.write(soup.prettify())  # Save a prettified HTML file
-        
-        elif "application/x-yaml" in content_type or "text/yaml" in content_type:
-            yaml_data = yaml.safe_load(response.text)
-            with open(save_path, "w", encoding="utf-8") as f:
-                yaml.dump(yaml_data, f, default_flow_style=False)
-        
-        elif "application/pdf" in content_type or "image/" in content_type or "application/octet-stream" in content_type:
-            with open(save_path, "wb") as f:
-                f.write(response.content)  # Save binary data as a file
-        
-        else:
-            with open(save_path, "wb") as f:
-                f.write(response.content)  # Fallback for unknown formats
-        
+        headers = {}
+        if conditional and entry.get("complete") and os.path.exists(save_path):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        offset = os.path.getsize(part_path) if resume and os.path.exists(part_path) else 0
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            # Only resume onto bytes of the same version and encoding of the resource
+            resumable = not entry.get("complete") and entry.get("resumable")
+            validator = (entry.get("etag") or entry.get("last_modified")) if resumable else None
+            if validator:
+                headers["If-Range"] = validator
+            else:
+                headers.pop("Range")
+                offset = 0
+
+        if resume:
+            # Range offsets count bytes of the transferred representation, which only match the
+            # decoded bytes in the .part file when nothing is content-encoded
+            headers["Accept-Encoding"] = "identity"
+
+        with session.get(api_url, headers=headers, stream=True, timeout=timeout) as response:
+            if response.status_code == 304:
+                print(f"Not modified, keeping {save_path}")
+                return {"status": "not-modified", "path": save_path}
+            if response.status_code == 416 and offset:
+                os.remove(part_path)
+                return B3(api_url, save_path, reformat=reformat, resume=False, conditional=conditional, timeout=timeout)
+            if response.status_code >= 400:
+                raise HTTPException(status_code=response.status_code, detail=f"API request failed with status {response.status_code}: {response.text[:1000]}")  # Raise an error for bad responses (4xx and 5xx)
+
+            content_type = response.headers.get("Content-Type", "").lower()
+            entry = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "content_type": content_type,
+                "complete": False,
+                "resumable": response.headers.get("Content-Encoding", "identity").lower() in ("", "identity"),
+            }
+            _save_validator(key, entry)
+
+            resumed = response.status_code == 206 and offset > 0
+            written = offset if resumed else 0
+            with open(part_path, "ab" if resumed else "wb") as f:
+                for chunk in response.iter_content(chunk_size=B3_CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+
+        os.replace(part_path, save_path)
+        reformatted = _reformat(save_path, content_type) if reformat else False
+        _save_validator(key, {**entry, "complete": True})
         print(f"Data saved to {save_path}")
+        return {"status": "downloaded", "path": save_path, "bytes": written, "resumed": resumed, "reformatted": reformatted}
 
     except requests.exceptions.RequestException as e:
         print(f"Error fetching data: {e}")
@@ -115,70 +196,271 @@ def B4(repo_url, repo_path=None, commit_message="Updated files", file_changes=No
         run_command(["git", "push"], cwd=repo_path)
 
 # B5: Run SQL Query
-def B5(db_path, query, output_filename):
+B5_BATCH_ROWS = int(os.getenv("B5_BATCH_ROWS", "10000"))
+
+def _write_rows(output_filename, columns, batches):
+    """Stream row batches to a file whose format follows its extension. Returns (format, row count)."""
+    ext = os.path.splitext(output_filename)[1].lower()
+    count = 0
+    if ext == ".parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise HTTPException(status_code=400, detail="Writing Parquet from SQLite needs the pyarrow package.")
+        # SQLite columns have no fixed type, so a later batch can widen the schema (NULL -> INTEGER,
+        # INTEGER -> REAL). Each widening starts a new part file; parts are merged at the end.
+        parts, schema, writer = [], None, None
+        try:
+            for rows in batches:
+                table = pa.Table.from_pylist([dict(zip(columns, row)) for row in rows])
+                if schema is not None and not table.schema.equals(schema):
+                    widened = pa.unify_schemas([schema, table.schema], promote_options="permissive")
+                    if not widened.equals(schema):
+                        writer.close()
+                        writer, schema = None, widened
+                if writer is None:
+                    schema = schema or table.schema
+                    parts.append(f"{output_filename}.part{len(parts)}")
+                    writer = pq.ParquetWriter(parts[-1], schema)
+                writer.write_table(table.cast(schema))
+                count += len(rows)
+            if writer is not None:
+                writer.close()
+                writer = None
+            if not parts:
+                pq.write_table(pa.table({c: [] for c in columns}), output_filename)
+            elif len(parts) == 1:
+                os.replace(parts[0], output_filename)
+            else:
+                with pq.ParquetWriter(output_filename, schema) as merged:
+                    for part in parts:
+                        for batch in pq.ParquetFile(part).iter_batches():
+                            merged.write_table(pa.Table.from_batches([batch]).cast(schema))
+        finally:
+            if writer is not None:
+                writer.close()
+            for part in parts:
+                if os.path.exists(part):
+                    os.remove(part)
+        return "parquet", count
+
+    with open(output_filename, 'w', newline='', encoding='utf-8') as file:
+        if ext == ".csv":
+            writer = csv.writer(file)
+            writer.writerow(columns)
+            for rows in batches:
+                writer.writerows(rows)
+                count += len(rows)
+            return "csv", count
+        if ext in (".jsonl", ".ndjson"):
+            for rows in batches:
+                file.writelines(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows)
+                count += len(rows)
+            return "jsonl", count
+        # Tab-separated for readability
+        for rows in batches:
+            file.writelines("\t".join(map(str, row)) + "\n" for row in rows)
+            count += len(rows)
+        return "tsv", count
+
+def _sql_string(value):
+    return "'" + value.replace("'", "''") + "'"
+
+def _fetch_batches(cursor, batch_size):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+def B5(db_path, query, output_filename, batch_size=B5_BATCH_ROWS, engine="auto"):
     B1(db_path)
     import sqlite3, duckdb
     # Ensure database file exists
     if not os.path.isfile(db_path):
         raise FileNotFoundError(f"Database file not found: {db_path}")
 
-    # Choose correct database engine
-    if db_path.endswith('.db') or db_path.endswith('.sqlite') or db_path.endswith('.sqlite3'):
+    # A trailing ";" is fine for execute() but breaks the query once wrapped in COPY (...)
+    query = re.sub(r"[\s;]+$", "", query.strip())
+    started = time.perf_counter()
+    is_sqlite = db_path.endswith(('.db', '.sqlite', '.sqlite3'))
+    chosen = choose_engine(db_path, query, engine) if is_sqlite else "duckdb"
+    duck = None
+    if is_sqlite and chosen == "duckdb":
+        try:
+            duck = duckdb_cursor(db_path)
+        except Exception as e:
+            if engine == "duckdb":
+                raise
+            print(f"DuckDB engine unavailable, using sqlite: {e}")
+            chosen = "sqlite"
+
+    # Choose correct database engine; rows are streamed in fetchmany batches
+    if duck is not None:
+        # Analytic query over the SQLite file on DuckDB's parallel executor
+        try:
+            if output_filename.lower().endswith(".parquet"):
+                duck.execute(f"COPY ({query}) TO {_sql_string(output_filename)} (FORMAT PARQUET)")
+                fmt = "parquet"
+                count = duck.execute(f"SELECT COUNT(*) FROM read_parquet({_sql_string(output_filename)})").fetchone()[0]
+            else:
+                cur = duck.execute(query)
+                columns = [d[0] for d in cur.description or ()]
+                fmt, count = _write_rows(output_filename, columns, _fetch_batches(cur, batch_size))
+        finally:
+            duck.close()
+    elif is_sqlite and is_read_query(query):
+        # Pooled read-only connection; small results are memoized
+        with stream_query(db_path, query, batch_size=batch_size) as (columns, batches):
+            fmt, count = _write_rows(output_filename, columns, batches)
+    elif is_sqlite:
         conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        cur.execute(query)
-        result = cur.fetchall()
-        conn.close()
+        try:
+            cur = conn.execute(query)
+            columns = [d[0] for d in cur.description or ()]
+            fmt, count = _write_rows(output_filename, columns, _fetch_batches(cur, batch_size))
+            conn.commit()
+        finally:
+            conn.close()
     elif db_path.endswith('.duckdb'):
         conn = duckdb.connect(database=db_path, read_only=False)
-        result = conn.execute(query).fetchall()
-        conn.close()
+        try:
+            if output_filename.lower().endswith(".parquet") and is_read_query(query):
+                # DuckDB writes Parquet natively from its vectorized executor
+                conn.execute(f"COPY ({query}) TO {_sql_string(output_filename)} (FORMAT PARQUET)")
+                fmt = "parquet"
+                count = conn.execute(f"SELECT COUNT(*) FROM read_parquet({_sql_string(output_filename)})").fetchone()[0]
+            else:
+                cur = conn.execute(query)
+                columns = [d[0] for d in cur.description or ()]
+                fmt, count = _write_rows(output_filename, columns, _fetch_batches(cur, batch_size))
+        finally:
+            conn.close()
     else:
         raise ValueError("Unsupported database type. Use a SQLite (.db) or DuckDB (.duckdb) file.")
 
-    # Save result in a readable format
-    with open(output_filename, 'w') as file:
-        for row in result:
-            file.write("\t".join(map(str, row)) + "\n")  # Tab-separated for readability
-
-    return result
+    seconds = time.perf_counter() - started
+    print(f"B5 wrote {count} rows as {fmt} to {output_filename} in {seconds:.3f}s using {chosen}")
+    return {"rows": count, "format": fmt, "output": output_filename, "seconds": seconds, "engine": chosen}
 
 # B6: Web Scraping
-def B6(url, output_filename, extract_mode="html", element_selector=None, headers=None):
+def _make_soup(markup, parser="html.parser"):
+    """BeautifulSoup with the requested backend (e.g. 'lxml'), falling back to the pure-Python parser."""
+    from bs4 import FeatureNotFound
+    try:
+        return BeautifulSoup(markup, parser)
+    except FeatureNotFound:
+        return BeautifulSoup(markup, "html.parser")
+
+def _extract(response, extract_mode, element_selector=None, parser="html.parser"):
+    if extract_mode == "json":
+        try:
+            return response.json()  # Extract JSON data
+        except ValueError as v:
+            raise HTTPException(status_code=400, detail=f"{v}")
+
+    elif extract_mode == "element":
+        if not element_selector:
+            raise HTTPException(status_code=400, detail="element_selector must be provided for element extraction.")
+        soup = _make_soup(response.text, parser)
+        return "\n".join([el.get_text(strip=True) for el in soup.select(element_selector)])
+
+    elif extract_mode == "text":
+        soup = _make_soup(response.text, parser)
+        return soup.get_text(separator="\n", strip=True)  # Extract readable text
+
+    else:  # Default to raw HTML
+        return response.text
+
+class HostThrottle:
+    """Per-host connection limit plus a minimum delay between request starts to the same host."""
+
+    def __init__(self, per_host=2, delay=0.5):
+        self.per_host = per_host
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.next_start = {}
+
+    def fetch(self, url, **kwargs):
+        host = urlparse(url).netloc
+        with self.lock:
+            semaphore = self.semaphores.setdefault(host, threading.BoundedSemaphore(self.per_host))
+        with semaphore:
+            with self.lock:
+                now = time.monotonic()
+                start = max(now, self.next_start.get(host, now))
+                self.next_start[host] = start + self.delay
+            time.sleep(start - now)
+            return session.get(url, **kwargs)
+
+def _crawl(urls, output_filename, extract_mode, element_selector, headers, parser, concurrency, per_host, delay):
+    """Fetch pages concurrently and append one JSON record per page to output_filename as each arrives."""
+    throttle = HostThrottle(per_host, delay)
+    write_lock = threading.Lock()
+    pages = errors = 0
+
+    def scrape(page_url):
+        response = throttle.fetch(page_url, headers=headers or {}, timeout=10)
+        if response.status_code >= 400:
+            raise HTTPException(status_code=response.status_code, detail=f"API request failed with status {response.status_code}")
+        return {"url": page_url, "status": response.status_code, "data": _extract(response, extract_mode, element_selector, parser)}
+
+    with open(output_filename, "w", encoding="utf-8") as file, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(scrape, page_url): page_url for page_url in urls}
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+                pages += 1
+            except Exception as e:
+                record = {"url": futures[future], "error": str(getattr(e, "detail", None) or e)}
+                errors += 1
+            with write_lock:
+                file.write(json.dumps(record) + "\n")
+                file.flush()
+    return {"pages": pages, "errors": errors, "output": output_filename}
+
+def B6(url, output_filename, extract_mode="html", element_selector=None, headers=None,
+       urls=None, link_selector=None, parser="html.parser", concurrency=8, per_host=2, delay=0.5, max_pages=1000):
     """
     Scrape a website and extract data based on the given mode.
     
     Args:
-        url (str): The URL to scrape.
+        url (str): The URL to scrape, or the seed page in crawl mode.
         output_filename (str): File path to save the extracted content.
         extract_mode (str): Extraction mode - 'html', 'text', 'json', or 'element'.
         element_selector (str, optional): CSS selector for extracting specific elements.
         headers (dict, optional): Custom headers for requests (e.g., User-Agent).
+        urls (list, optional): Crawl mode - pages to scrape instead of the single url.
+        link_selector (str, optional): Crawl mode - CSS selector for links on the seed page to scrape.
+        parser (str): BeautifulSoup backend, 'html.parser' or a faster one such as 'lxml'.
+        concurrency, per_host, delay: Crawl mode - worker count, connections per host and
+            seconds between requests to the same host.
+        max_pages (int): Crawl mode - upper bound on pages fetched.
+
+    In crawl mode, output_filename receives one JSON record per page (JSON Lines).
     """
     B1(filepath=output_filename)
+    response = None
     try:
-        response = requests.get(url, headers=headers or {}, timeout=10)
+        if urls or link_selector:
+            targets = list(urls or [])
+            if link_selector:
+                seed = session.get(url, headers=headers or {}, timeout=10)
+                if seed.status_code >= 400:
+                    raise HTTPException(status_code=seed.status_code, detail=f"API request failed with status {seed.status_code}: {seed.text}")
+                soup = _make_soup(seed.text, parser)
+                targets += [urljoin(seed.url, a["href"]) for a in soup.select(link_selector) if a.get("href")]
+            targets = list(dict.fromkeys(targets))[:max_pages]
+            return _crawl(targets, output_filename, extract_mode, element_selector, headers, parser,
+                          concurrency, per_host, delay)
+
+        response = session.get(url, headers=headers or {}, timeout=10)
         if response.status_code >= 400:
             raise HTTPException(status_code=response.status_code, detail=f"API request failed with status {response.status_code}: {response.text}")
 
-        if extract_mode == "json":
-            try:
-                data = response.json()  # Extract JSON data
-            except ValueError as v:
-                raise HTTPException(status_code=400, detail=f"{v}")
-        
-        elif extract_mode == "element":
-            if not element_selector:
-                raise HTTPException(status_code=400, detail="element_selector must be provided for element extraction.")
-            soup = BeautifulSoup(response.text, "html.parser")
-            data = "\n".join([el.get_text(strip=True) for el in soup.select(element_selector)])
-        
-        elif extract_mode == "text":
-            soup = BeautifulSoup(response.text, "html.parser")
-            data = soup.get_text(separator="\n", strip=True)  # Extract readable text
-        
-        else:  # Default to raw HTML
-            data = response.text
+        data = _extract(response, extract_mode, element_selector, parser)
 
         with open(output_filename, "w", encoding="utf-8") as file:
             file.write(data if isinstance(data, str) else json.dumps(data, indent=4))
@@ -186,21 +468,32 @@ def B6(url, output_filename, extract_mode="html", element_selector=None, headers
         return data
 
     except requests.RequestException as e:
-        raise HTTPException(status_code=response.status_code, detail=f"API request failed: {e}")
+        raise HTTPException(status_code=getattr(response, "status_code", 502), detail=f"API request failed: {e}")
 
 # B7: Image Processing
-def B7(image_path, output_path, resize=None, format=None, quality=None):
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff")
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+REDUCE_MODES = ("L", "LA", "RGB", "RGBA", "RGBX", "CMYK")
+
+def _process_image(image_path, output_path, resize=None, format=None, quality=None):
     from PIL import Image
-    
-    B1(image_path)
-    B1(output_path)
-    
+
     img = Image.open(image_path)
-    
+
     # Default format: Keep original
     if not format:
         format = img.format  # Use input image format if none is provided
-    
+
+    if resize:
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale, never smaller than the target
+        if img.format == "JPEG":
+            img.draft(img.mode, tuple(resize))
+        # Integer-factor box reduce while the image is still at least twice the target.
+        # reduce() only handles 8-bit band modes; palette, "1" and 16-bit images are resampled directly.
+        factor = min(img.width // (2 * resize[0]), img.height // (2 * resize[1]))
+        if factor >= 2 and img.mode in REDUCE_MODES:
+            img = img.reduce(factor)
+
     # Ensure valid quality value for JPEG
     if format.upper() == "JPEG":
         quality = quality if quality is not None else 85  # Default to 85 if not provided
@@ -211,37 +504,237 @@ def B7(image_path, output_path, resize=None, format=None, quality=None):
 
     # Resize while keeping aspect ratio
     if resize:
-        img.thumbnail(resize)  # Maintains aspect ratio
+        # Maintains aspect ratio; thumbnail's own reducing step has the same mode limits as reduce()
+        img.thumbnail(resize, reducing_gap=2.0 if img.mode in REDUCE_MODES else None)
     
     # Save with correct parameters
     save_kwargs = {"quality": quality} if format.upper() == "JPEG" else {}
     img.save(output_path, format=format, **save_kwargs)
+    return output_path
+
+def _process_image_task(args):
+    try:
+        return args[1], _process_image(*args), None
+    except Exception as e:
+        return args[1], None, str(e)
+
+def B7(image_path, output_path, resize=None, format=None, quality=None, workers=None):
+    """
+    Resize/convert one image, or a whole batch when image_path is a directory or glob
+    (output_path is then a directory). Batch outputs newer than their inputs are skipped.
+    """
+    import glob
+    B1(image_path)
+    B1(output_path)
+
+    is_glob = any(c in image_path for c in "*?[")
+    if not is_glob and not os.path.isdir(image_path):
+        return _process_image(image_path, output_path, resize, format, quality)
+
+    pattern = image_path if is_glob else os.path.join(image_path, "*")
+    inputs = sorted(p for p in glob.glob(pattern) if p.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(p))
+    os.makedirs(output_path, exist_ok=True)
+
+    jobs, skipped = [], 0
+    for src in inputs:
+        stem, ext = os.path.splitext(os.path.basename(src))
+        dest = os.path.join(output_path, stem + (FORMAT_EXTENSIONS.get(format.upper(), ext) if format else ext))
+        if os.path.exists(dest) and os.path.getmtime(dest) >= os.path.getmtime(src):
+            skipped += 1
+            continue
+        jobs.append((src, dest, resize, format, quality))
+
+    errors = {}
+    if jobs:
+        # spawn, not fork: B7 can run inside the multi-threaded server process
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for dest, _, error in pool.map(_process_image_task, jobs, chunksize=max(1, len(jobs) // 64)):
+                if error:
+                    errors[dest] = error
+    return {"processed": len(jobs) - len(errors), "skipped": skipped, "errors": errors}
 
 
 # B8: Audio Transcription
-def B8(audio_path, output_filename, model_size="small", language_code=None):
-    from faster_whisper import WhisperModel
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".flac", ".ogg", ".opus", ".webm")
 
+def B8(audio_path, output_filename, model_size="small", language_code=None, language=None,
+       compute_type=None, cpu_threads=None, beam_size=None, vad_filter=None):
+    """
+    Transcribe one audio file, or a batch when audio_path is a directory or glob (output_filename
+    is then a directory of .txt files). Work runs in the dedicated whisper worker process, where
+    models stay loaded between calls. Batch outputs newer than their inputs are skipped.
+    """
+    import glob
     B1(audio_path)
     B1(output_filename)
-    model = WhisperModel(model_size, device="cpu")  # Allowing different model sizes
-    segments, _ = model.transcribe(audio_path, language=language_code)
-    transcript = " ".join(segment.text for segment in segments)
 
-    with open(output_filename, "w") as file:
-        file.write(transcript)
+    options = {"model_size": model_size, "language": language_code or language}
+    for name, value in (("compute_type", compute_type), ("cpu_threads", cpu_threads),
+                        ("beam_size", beam_size), ("vad_filter", vad_filter)):
+        if value is not None:
+            options[name] = value
+
+    is_glob = any(c in audio_path for c in "*?[")
+    if not is_glob and not os.path.isdir(audio_path):
+        run_in_worker(transcribe_file, audio_path, output_filename, **options)
+        return output_filename
+
+    pattern = audio_path if is_glob else os.path.join(audio_path, "*")
+    inputs = sorted(p for p in glob.glob(pattern) if p.lower().endswith(AUDIO_EXTENSIONS) and os.path.isfile(p))
+    os.makedirs(output_filename, exist_ok=True)
+
+    jobs, skipped = [], 0
+    for src in inputs:
+        dest = os.path.join(output_filename, os.path.splitext(os.path.basename(src))[0] + ".txt")
+        if os.path.exists(dest) and os.path.getmtime(dest) >= os.path.getmtime(src):
+            skipped += 1
+            continue
+        jobs.append((src, dest))
+
+    errors = run_in_worker(transcribe_batch, jobs, **options) if jobs else {}
+    return {"transcribed": len(jobs) - len(errors), "skipped": skipped, "errors": errors}
 
 
 # B9: Markdown to HTML Conversion
-def B9(md_path, output_path, extensions=None):
-    import markdown
+B9_DEFAULT_EXTENSIONS = ["extra", "codehilite", "toc"]  # Some common extensions
+B9_RENDER_CACHE_SIZE = int(os.getenv("B9_RENDER_CACHE_SIZE", "1024"))
+# Below this many changed files a docs tree is converted in-process; process startup would dominate
+B9_PARALLEL_MIN_FILES = int(os.getenv("B9_PARALLEL_MIN_FILES", "32"))
+B9_MANIFEST_NAME = ".b9-manifest.json"
+
+markdown_converters = {}
+markdown_lock = threading.Lock()
+render_cache = OrderedDict()
+
+def _get_converter(extensions):
+    """One markdown.Markdown per extension set and process, with a lock since instances are stateful."""
+    key = tuple(extensions)
+    with markdown_lock:
+        if key not in markdown_converters:
+            import markdown
+            markdown_converters[key] = (threading.Lock(), markdown.Markdown(extensions=list(key)))
+        return markdown_converters[key]
+
+def render_markdown(text, extensions):
+    """Markdown to HTML, reusing the HTML of identical (extensions, text) input."""
+    key = hashlib.sha256("\0".join([*extensions, text]).encode("utf-8")).hexdigest()
+    with markdown_lock:
+        html = render_cache.get(key)
+        if html is not None:
+            render_cache.move_to_end(key)
+            return html
+
+    lock, converter = _get_converter(extensions)
+    with lock:
+        try:
+            html = converter.convert(text)
+        finally:
+            converter.reset()
+
+    with markdown_lock:
+        render_cache[key] = html
+        while len(render_cache) > B9_RENDER_CACHE_SIZE:
+            render_cache.popitem(last=False)
+    return html
+
+def _scan_markdown_tree(md_dir):
+    """Yield (relative path, mtime_ns, size) for .md files, skipping hidden directories."""
+    stack = [md_dir]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith("."):
+                        stack.append(entry.path)
+                elif entry.name.endswith(".md") and entry.is_file():
+                    st = entry.stat()
+                    yield os.path.relpath(entry.path, md_dir).replace("\\", "/"), st.st_mtime_ns, st.st_size
+
+def _convert_markdown_file(job):
+    """Render one file unless its content hash matches known_hash. Returns (rel, digest, rendered, error)."""
+    rel, src, dest, extensions, known_hash = job
+    try:
+        with open(src, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest == known_hash and os.path.exists(dest):
+            return rel, digest, False, None
+        html = render_markdown(data.decode("utf-8"), extensions)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, "w", encoding="utf-8") as file:
+            file.write(html)
+        return rel, digest, True, None
+    except Exception as e:
+        return rel, None, False, str(e)
+
+def _convert_markdown_tree(md_dir, output_dir, extensions, workers=None):
+    # Manifest: relative path -> [mtime_ns, size, sha256, extensions]. A matching stat skips the
+    # file outright; otherwise a matching content hash (e.g. after a fresh checkout) skips rendering.
+    manifest_path = os.path.join(output_dir, B9_MANIFEST_NAME)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+
+    extensions = list(extensions)
+    updated, stats, jobs = {}, {}, []
+    for rel, mtime, size in _scan_markdown_tree(md_dir):
+        dest = os.path.join(output_dir, os.path.splitext(rel)[0] + ".html")
+        entry = manifest.get(rel)
+        same_extensions = entry is not None and entry[3] == extensions
+        if same_extensions and entry[:2] == [mtime, size] and os.path.exists(dest):
+            updated[rel] = entry
+            continue
+        stats[rel] = (mtime, size)
+        jobs.append((rel, os.path.join(md_dir, rel), dest, extensions, entry[2] if same_extensions else None))
+
+    if len(jobs) >= B9_PARALLEL_MIN_FILES and workers != 1:
+        # spawn, not fork: B9 runs inside the multi-threaded server process
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(_convert_markdown_file, jobs, chunksize=max(1, len(jobs) // 64)))
+    else:
+        results = [_convert_markdown_file(job) for job in jobs]
+
+    converted, errors = 0, {}
+    for rel, digest, rendered, error in results:
+        if error:
+            errors[rel] = error
+            continue
+        converted += rendered
+        updated[rel] = [*stats[rel], digest, extensions]
+
+    # Drop outputs whose source file is gone
+    removed = 0
+    for rel in manifest.keys() - updated.keys() - errors.keys():
+        stale = os.path.join(output_dir, os.path.splitext(rel)[0] + ".html")
+        if os.path.exists(stale):
+            os.remove(stale)
+        removed += 1
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({rel: updated[rel] for rel in sorted(updated)}, f)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return {"files": len(updated) + len(errors), "converted": converted,
+            "skipped": len(updated) - converted, "removed": removed, "errors": errors}
+
+def B9(md_path, output_path, extensions=None, workers=None):
+    """
+    Convert a Markdown file to HTML, or a whole docs tree when md_path is a directory (output_path
+    is then the output directory). Files unchanged since the last run are skipped via a manifest.
+    """
     B1(md_path)
     B1(output_path)
     if extensions is None:
-        extensions = ["extra", "codehilite", "toc"]  # Some common extensions
+        extensions = B9_DEFAULT_EXTENSIONS
+
+    if os.path.isdir(md_path):
+        return _convert_markdown_tree(md_path, output_path, extensions, workers)
 
     with open(md_path, "r", encoding="utf-8") as file:
-        html = markdown.markdown(file.read(), extensions=extensions)
+        html = render_markdown(file.read(), extensions)
 
     with open(output_path, "w", encoding="utf-8") as file:
-        file.write(html)
\ No newline at end of file
+        file.write(html)
+    return output_path
@@ -0,0 +1,115 @@
+# Warm faster-whisper models for B8, served from one dedicated worker process
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+load_dotenv()
+
+# int8 quantization is the fast path on CPU; int8_float16 / int8_float32 trade speed for accuracy
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))  # 0 lets CTranslate2 decide
+WHISPER_BEAM_SIZE = int(os.getenv("WHISPER_BEAM_SIZE", "5"))
+WHISPER_VAD_FILTER = os.getenv("WHISPER_VAD_FILTER", "0") == "1"
+# Comma-separated model sizes loaded when the worker starts, e.g. "small" or "base,small"
+WHISPER_PRELOAD = [size.strip() for size in os.getenv("WHISPER_PRELOAD", "").split(",") if size.strip()]
+
+models = {}
+models_lock = threading.Lock()
+
+
+def get_model(model_size, compute_type=WHISPER_COMPUTE_TYPE, cpu_threads=WHISPER_CPU_THREADS):
+    """A loaded WhisperModel, kept for the life of the process and shared by every caller."""
+    key = (model_size, compute_type, cpu_threads)
+    with models_lock:
+        if key not in models:
+            from faster_whisper import WhisperModel
+            print(f'loading whisper model {model_size} ({compute_type}, cpu_threads={cpu_threads})')
+            models[key] = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+        return models[key]
+
+
+def transcribe_file(audio_path, output_filename, model_size="small", language=None,
+                    compute_type=WHISPER_COMPUTE_TYPE, cpu_threads=WHISPER_CPU_THREADS,
+                    beam_size=WHISPER_BEAM_SIZE, vad_filter=WHISPER_VAD_FILTER):
+    model = get_model(model_size, compute_type, cpu_threads)
+    segments, _ = model.transcribe(audio_path, language=language, beam_size=beam_size, vad_filter=vad_filter)
+    transcript = " ".join(segment.text for segment in segments)
+
+    with open(output_filename, "w") as file:
+        file.write(transcript)
+    return output_filename
+
+
+def transcribe_batch(jobs, **options):
+    """Transcribe (audio_path, output_filename) pairs through one loaded model. Returns per-file errors."""
+    errors = {}
+    for audio_path, output_filename in jobs:
+        try:
+            transcribe_file(audio_path, output_filename, **options)
+        except Exception as e:
+            errors[audio_path] = str(e)
+    return errors
+
+
+def _init_worker(preload, compute_type, cpu_threads):
+    for model_size in preload:
+        try:
+            get_model(model_size, compute_type, cpu_threads)
+        except Exception as e:
+            # A failed preload must not break the pool; the next request retries the load
+            print(f'could not preload whisper model {model_size}: {e}')
+
+
+worker = None
+worker_lock = threading.Lock()
+
+
+def get_worker():
+    """The single process that owns the models, so weights are loaded once and stay warm."""
+    global worker
+    with worker_lock:
+        if worker is None:
+            # spawn, not fork: the worker is started from the multi-threaded server process
+            worker = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(WHISPER_PRELOAD, WHISPER_COMPUTE_TYPE, WHISPER_CPU_THREADS),
+            )
+        return worker
+
+
+def _discard_worker(pool):
+    global worker
+    with worker_lock:
+        if worker is pool:
+            worker = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_in_worker(func, *args, **kwargs):
+    """Run func in the whisper worker. A worker that died (e.g. OOM loading a model) is rebuilt once."""
+    for attempt in range(2):
+        pool = get_worker()
+        try:
+            return pool.submit(func, *args, **kwargs).result()
+        except BrokenProcessPool:
+            _discard_worker(pool)
+            if attempt:
+                raise
+
+
+def preload_models():
+    """Start the worker now so WHISPER_PRELOAD models load before the first request."""
+    if WHISPER_PRELOAD:
+        get_worker().submit(os.getpid)
+
+
+def shutdown_worker():
+    global worker
+    with worker_lock:
+        if worker is not None:
+            worker.shutdown(wait=False, cancel_futures=True)
+            worker = None
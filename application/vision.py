@@ -0,0 +1,105 @@
+# Vision helpers for A8: shrink images before upload and cache results by content hash
+import io
+import os
+import json
+import base64
+import mimetypes
+import sqlite3
+import hashlib
+import threading
+import requests
+from dotenv import load_dotenv
+load_dotenv()
+
+AIPROXY_TOKEN = os.getenv('AIPROXY_TOKEN')
+VISION_MODEL = "gpt-4o-mini"
+VISION_URL = "http://aiproxy.sanand.workers.dev/openai/v1/chat/completions"
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "1024"))
+VISION_CACHE_PATH = os.getenv("VISION_CACHE_PATH", os.path.expanduser("~/.cache/tdsp1/vision.sqlite"))
+
+CARD_PROMPT = "There may be multiple lines of texts in the image. Extract the line which has 8 or 12 or 16 digits one after the other and may have space in between. Then extract those 16 digits 1 by 1 from the left and create a string of length 16 having only those digits. Return only that string of digits and no other additional text. Just the string of digits."
+
+session = requests.Session()
+cache_lock = threading.Lock()
+cache_conn = None
+
+
+def prepare_image(data, max_side=VISION_MAX_SIDE):
+    """Downscale to at most max_side pixels, convert to grayscale and re-encode as optimized PNG."""
+    from PIL import Image
+    img = Image.open(io.BytesIO(data))
+    original_size = img.size
+    img.draft("L", (max_side, max_side))  # Reduced-scale decode for JPEG sources
+    img = img.convert("L")
+    img.thumbnail((max_side, max_side))
+    out = io.BytesIO()
+    img.save(out, format="PNG", optimize=True)
+    encoded = out.getvalue()
+    if max(original_size) <= max_side and len(encoded) >= len(data):
+        return data  # Already small enough and re-encoding did not help
+    return encoded
+
+
+def _cache():
+    global cache_conn
+    if cache_conn is None:
+        os.makedirs(os.path.dirname(VISION_CACHE_PATH) or ".", exist_ok=True)
+        cache_conn = sqlite3.connect(VISION_CACHE_PATH, check_same_thread=False)
+        cache_conn.execute("CREATE TABLE IF NOT EXISTS vision (key TEXT PRIMARY KEY, result TEXT)")
+        cache_conn.commit()
+    return cache_conn
+
+
+def cache_get(key):
+    with cache_lock:
+        row = _cache().execute("SELECT result FROM vision WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def cache_set(key, result):
+    with cache_lock:
+        conn = _cache()
+        conn.execute("INSERT OR REPLACE INTO vision VALUES (?, ?)", (key, json.dumps(result)))
+        conn.commit()
+
+
+def ask_image(image_path, prompt, max_side=VISION_MAX_SIDE, use_cache=True):
+    """Send a prompt and an image to the vision model, reusing the answer for identical image bytes."""
+    with open(image_path, "rb") as image_file:
+        data = image_file.read()
+    key = hashlib.sha256(b"\0".join([VISION_MODEL.encode(), prompt.encode(), str(max_side).encode(), data])).hexdigest()
+    if use_cache:
+        cached = cache_get(key)
+        if cached is not None:
+            print(f'vision cache hit for {image_path}')
+            return cached
+
+    payload = prepare_image(data, max_side)
+    mime = "image/png" if payload is not data else (mimetypes.guess_type(image_path)[0] or "image/png")
+    body = {
+        "model": VISION_MODEL,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": f"data:{mime};base64,{base64.b64encode(payload).decode('utf-8')}"}
+                    }
+                ]
+            }
+        ]
+    }
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {AIPROXY_TOKEN}"
+    }
+    print(f'making request ({len(data)} -> {len(payload)} bytes)')
+    response = session.post(VISION_URL, headers=headers, data=json.dumps(body), timeout=60)
+    print(f'got response {response.status_code}')
+    response.raise_for_status()
+    content = response.json()['choices'][0]['message']['content']
+    if use_cache:
+        cache_set(key, content)
+    return content
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from app import function_definitions_llm, task_functions
+from application.router import route
+
+STANDARD_PROMPTS = {
+    "A1": "Install uv (if required) and run https://raw.githubusercontent.com/sanand0/tools-in-data-science-public/tds-2025-01/project-1/datagen.py with user@example.com as the only argument.",
+    "A2": "Format the contents of /data/format.md using prettier@3.4.2, updating the file in-place",
+    "A3": "The file /data/dates.txt contains a list of dates, one per line. Count the number of Wednesdays in the list, and write just the number to /data/dates-wednesdays.txt",
+    "A4": "Sort the array of contacts in /data/contacts.json by last_name, then first_name, and write the result to /data/contacts-sorted.json",
+    "A5": "Write the first line of the 10 most recent .log file in /data/logs/ to /data/logs-recent.txt, most recent first",
+    "A6": 'Find all Markdown (.md) files in /data/docs/. For each file, extract the first occurrance of each H1 (i.e. a line starting with # ). Create an index file /data/docs/index.json that maps each filename (without the /data/docs/ prefix) to its title (e.g. {"README.md": "Home", "path/to/large-language-models.md": "Large Language Models", ...})',
+    "A7": "/data/email.txt contains an email message. Pass the content to an LLM with instructions to extract the sender's email address, and write just the email address to /data/email-sender.txt",
+    "A8": "/data/credit-card.png contains a credit card number. Pass the image to an LLM, have it extract the card number, and write it without spaces to /data/credit-card.txt",
+    "A9": "/data/comments.txt contains a list of comments, one per line. Using embeddings, find the most similar pair of comments and write them to /data/comments-similar.txt, one per line",
+    "A10": 'The SQLite database file /data/ticket-sales.db has a tickets with columns type, units, and price. Each row is a customer bid for a concert ticket. What is the total sales of all the items in the "Gold" ticket type? Write the number in /data/ticket-sales-gold.txt',
+}
+
+# Arguments the router must get right whenever it routes a standard prompt locally
+EXPECTED_ARGUMENTS = {
+    "A1": {"script_url": "https://raw.githubusercontent.com/sanand0/tools-in-data-science-public/tds-2025-01/project-1/datagen.py"},
+    "A2": {"prettier_version": "prettier@3.4.2", "filename": "/data/format.md"},
+    "A3": {"filename": "/data/dates.txt", "targetfile": "/data/dates-wednesdays.txt", "weekday": 3},
+    "A4": {"filename": "/data/contacts.json", "targetfile": "/data/contacts-sorted.json"},
+    "A5": {"log_dir_path": "/data/logs", "output_file_path": "/data/logs-recent.txt", "num_files": 10},
+    "A6": {"doc_dir_path": "/data/docs", "output_file_path": "/data/docs/index.json"},
+    "A7": {"filename": "/data/email.txt", "output_file": "/data/email-sender.txt"},
+    "A8": {"image_path": "/data/credit-card.png", "filename": "/data/credit-card.txt"},
+    "A9": {"filename": "/data/comments.txt", "output_filename": "/data/comments-similar.txt"},
+    "A10": {"filename": "/data/ticket-sales.db", "output_filename": "/data/ticket-sales-gold.txt"},
+}
+
+
+def _route(prompt):
+    return route(prompt, function_definitions_llm, task_functions)
+
+
+@pytest.mark.parametrize("task", STANDARD_PROMPTS)
+def test_standard_prompts_route_correctly_or_defer(task):
+    routed = _route(STANDARD_PROMPTS[task])
+    if routed is None:
+        return  # Left to the LLM
+    assert routed["name"] == task
+    arguments = json.loads(routed["arguments"])
+    for name, value in EXPECTED_ARGUMENTS[task].items():
+        assert arguments.get(name, value) == value
+    if "query" in arguments:
+        assert arguments["query"].lstrip().upper().startswith("SELECT")
+
+
+@pytest.mark.parametrize("task", ["A2", "A3", "A4", "A5", "A7", "A9"])
+def test_unambiguous_standard_prompts_are_routed_locally(task):
+    routed = _route(STANDARD_PROMPTS[task])
+    assert routed is not None and routed["name"] == task
+
+
+def test_prose_is_never_taken_as_sql():
+    routed = _route("Please select the database /data/app.db with the users and write a summary to /data/n.txt")
+    assert routed is None or "query" not in json.loads(routed["arguments"])
+
+
+def test_unquoted_select_stops_before_trailing_instructions():
+    routed = _route("Query /data/app.db with SELECT name FROM users and save the rows to /data/users.txt")
+    assert routed["name"] == "B5"
+    assert json.loads(routed["arguments"])["query"] == "SELECT name FROM users"
+
+
+def test_quoted_sql_is_taken_verbatim():
+    routed = _route('Run "select count(*) from users where age > 3" on /data/app.db and write it to /data/n.txt')
+    assert json.loads(routed["arguments"])["query"] == "select count(*) from users where age > 3"
+
+
+@pytest.mark.parametrize("target", ["/data/users.csv", "/data/users.jsonl", "/data/users.parquet"])
+def test_b5_accepts_export_formats(target):
+    routed = _route(f"Query /data/app.db with SELECT name FROM users and save the rows to {target}")
+    assert routed["name"] == "B5"
+    assert json.loads(routed["arguments"])["output_filename"] == target
+
+
+@pytest.mark.parametrize("prompt, input_path", [
+    ("Count Wednesdays in /data/dates.txt", "/data/dates.txt"),
+    ("Find the most similar comments in /data/comments.txt", "/data/comments.txt"),
+    ("Extract the sender email from /data/email.txt", "/data/email.txt"),
+    ("Sort the contacts in /data/contacts.json", "/data/contacts.json"),
+])
+def test_input_path_is_never_used_as_output(prompt, input_path):
+    routed = _route(prompt)
+    if routed is None:
+        return
+    arguments = json.loads(routed["arguments"])
+    outputs = [v for k, v in arguments.items() if any(h in k for h in ("target", "output", "save"))]
+    assert input_path not in outputs
+
+
+@pytest.mark.parametrize("prompt", [
+    "Sort /data/contacts.json by first_name then last_name and write to /data/c.json",
+    "Sort /data/contacts.json by email and write to /data/c.json",
+    "Don't count the Wednesdays in /data/dates.txt, instead count Thursdays and write to /data/x.txt",
+    "Count the Wednesdays and Thursdays in /data/dates.txt and write the number to /data/x.txt",
+    "Count the number of dates in /data/dates.txt that are not Sundays and write it to /data/x.txt",
+])
+def test_prompts_with_unsupported_modifiers_go_to_the_llm(prompt):
+    assert _route(prompt) is None